@@ -1,4 +1,10 @@
+import json
+import time
+import uuid
+from collections import OrderedDict
 import networkx as nx
+from webob import Response
+from ryu.app.wsgi import ControllerBase, WSGIApplication, route
 from ryu.base import app_manager
 from ryu.controller import ofp_event
 from ryu.controller.handler import CONFIG_DISPATCHER, MAIN_DISPATCHER, set_ev_cls
@@ -8,15 +14,178 @@ from ryu.topology import event
 from ryu.topology.api import get_switch, get_link
 from ryu.lib.packet import arp
 
+REST_APP = 'spb_switch_app'
+ARP_HOLD_DOWN = 1.0
+ARP_SWEEP = 60.0  # Seconds between sweeps of expired ARP cache entries and hold-downs
+
+
+class ArpCache:
+    # IP -> MAC entries learned from packet-ins expire after ttl seconds; entries seeded from the
+    # substrate mapping (static) do not.
+
+    def __init__(self, ttl=300):
+        self.ttl = ttl
+        self.entries = {}  # ip -> (mac, expiry time or None)
+
+    def learn(self, ip, mac, static=False):
+        current = self.entries.get(ip)
+        if not static and current is not None and current[1] is None and current[0] == mac:
+            return  # Keep a static entry static
+        self.entries[ip] = (mac, None if static else time.time() + self.ttl)
+
+    def lookup(self, ip):
+        entry = self.entries.get(ip)
+        if entry is None:
+            return None
+        if entry[1] is not None and entry[1] < time.time():
+            del self.entries[ip]
+            return None
+        return entry[0]
+
+    def evict(self, now=None):
+        # Drops every expired entry, including those never looked up again; returns how many
+        now = time.time() if now is None else now
+        expired = [ip for ip, (mac, expiry) in self.entries.items() if expiry is not None and expiry < now]
+        for ip in expired:
+            del self.entries[ip]
+        return len(expired)
+
+
+class FlowProgrammer:
+    # Flow-mods are queued per datapath and sent by flush(), each datapath's batch followed by one
+    # barrier request. Within a batch a later flow for the same (priority, match) replaces the earlier
+    # one, and a flow identical to one already installed on the switch is not sent again. flush(tag)
+    # times the batch until every datapath's barrier reply has arrived (see barrier_reply); a datapath
+    # that is forgotten before replying ends its part of the batch unconfirmed.
+    # Flows carry no timeouts; remove_port deletes those entering or leaving by a port whose link is gone.
+
+    def __init__(self):
+        self.pending = {}  # dpid -> (datapath, OrderedDict (priority, match) -> (flow-mod, actions, ports))
+        self.installed = {}  # dpid -> {(priority, match): (actions, ports)} as last sent to the switch
+        self.barriers = {}  # xid -> (tag, dpid)
+        self.batches = {}  # tag -> {'start', 'flows', 'waiting': set of dpids, 'complete'}
+
+    def add(self, datapath, priority, match, actions, buffer_id=None, ports=()):
+        # ports: the switch ports the flow matches traffic on or sends it out of
+        key, actions_key = (priority, str(match)), str(actions)
+        if buffer_id is None and self.installed.get(datapath.id, {}).get(key, (None,))[0] == actions_key:
+            return False
+        ofproto = datapath.ofproto
+        parser = datapath.ofproto_parser
+        inst = [parser.OFPInstructionActions(ofproto.OFPIT_APPLY_ACTIONS, actions)]
+        if buffer_id:
+            mod = parser.OFPFlowMod(datapath=datapath, buffer_id=buffer_id, priority=priority,
+                                    match=match, instructions=inst)
+        else:
+            mod = parser.OFPFlowMod(datapath=datapath, priority=priority, match=match, instructions=inst)
+        self.pending.setdefault(datapath.id, (datapath, OrderedDict()))[1][key] = (mod, actions_key, set(ports))
+        return True
+
+    def flush(self, tag=None):
+        # Returns the number of flow-mods sent
+        pending, self.pending = self.pending, {}
+        sent = 0
+        batch = {'start': time.time(), 'flows': 0, 'waiting': set(), 'complete': True}
+        for dpid, (datapath, mods) in pending.items():
+            installed = self.installed.setdefault(dpid, {})
+            for key, (mod, actions_key, ports) in mods.items():
+                datapath.send_msg(mod)
+                installed[key] = (actions_key, ports)
+            barrier = datapath.ofproto_parser.OFPBarrierRequest(datapath)
+            datapath.set_xid(barrier)
+            datapath.send_msg(barrier)
+            self.barriers[barrier.xid] = (tag, dpid)
+            batch['waiting'].add(dpid)
+            sent += len(mods)
+        batch['flows'] = sent
+        if tag is not None and batch['waiting']:
+            earlier = self.batches.get(tag)
+            if earlier is None:
+                self.batches[tag] = batch
+            else:  # The tag's earlier batch is still unconfirmed: both end with the last barrier reply
+                earlier['flows'] += sent
+                earlier['waiting'] |= batch['waiting']
+        return sent
+
+    def barrier_reply(self, dpid, xid, confirmed=True):
+        # Returns (tag, flows, seconds, complete) once the last datapath of a tagged batch has replied;
+        # complete is False if any datapath's part ended unconfirmed
+        tag, _ = self.barriers.pop(xid, (None, None))
+        batch = self.batches.get(tag)
+        if batch is None:
+            return None
+        if not confirmed:
+            batch['complete'] = False
+        batch['waiting'].discard(dpid)
+        if batch['waiting']:
+            return None
+        del self.batches[tag]
+        return tag, batch['flows'], time.time() - batch['start'], batch['complete']
+
+    def remove_port(self, datapath, port):
+        # The link on a port went away: deletes the switch's flows that match traffic entering by the port
+        # or send it out of it, so that traffic comes back to the controller and is routed again, and
+        # drops them, queued or installed, from the bookkeeping. Returns the number of installed flows dropped.
+        _, mods = self.pending.get(datapath.id, (None, {}))
+        for key in [key for key, (_, _, ports) in mods.items() if port in ports]:
+            del mods[key]
+        installed = self.installed.get(datapath.id, {})
+        stale = [key for key, (_, ports) in installed.items() if port in ports]
+        for key in stale:
+            del installed[key]
+        ofproto = datapath.ofproto
+        parser = datapath.ofproto_parser
+        for match, out_port in ((parser.OFPMatch(in_port=port), ofproto.OFPP_ANY), (parser.OFPMatch(), port)):
+            datapath.send_msg(parser.OFPFlowMod(datapath=datapath, command=ofproto.OFPFC_DELETE,
+                                                table_id=ofproto.OFPTT_ALL, out_port=out_port,
+                                                out_group=ofproto.OFPG_ANY, match=match))
+        return len(stale)
+
+    def forget(self, dpid):
+        # The switch reconnected or left: its flow table is no longer known and its barriers will not be
+        # answered. Returns the results, as barrier_reply, of the tagged batches this ends.
+        self.pending.pop(dpid, None)
+        self.installed.pop(dpid, None)
+        done = []
+        for xid, (tag, barrier_dpid) in list(self.barriers.items()):
+            if barrier_dpid == dpid:
+                result = self.barrier_reply(dpid, xid, confirmed=False)
+                if result is not None:
+                    done.append(result)
+        return done
+
+
 class SPBSwitch(app_manager.RyuApp):
     OFP_VERSIONS = [ofproto_v1_3.OFP_VERSION]
+    _CONTEXTS = {'wsgi': WSGIApplication}
 
     def __init__(self, *args, **kwargs):
         super(SPBSwitch, self).__init__(*args, **kwargs)
         self.mac_to_port = {}
-        self.ip_to_mac = {}  # Track IP-to-MAC mappings
+        # Proxy ARP: requests for known IPs are answered by the controller at the first switch. Requests
+        # for unknown IPs go to host ports only, once per ARP_HOLD_DOWN seconds per IP, never around the fabric.
+        self.arp_cache = ArpCache()
+        self.arp_requested = {}  # Unknown target IP -> time it was last sent to the host ports
+        self.arp_swept = time.time()  # Both are swept of expired entries every ARP_SWEEP seconds
+        # Where each host is attached: MAC -> (edge dpid, port). Learned only on ports that are not
+        # switch-to-switch links, so a host's MAC seen in transit never moves it.
+        self.hosts = {}
+        self.link_ports = set()  # (dpid, port) of every discovered inter-switch link
         self.topology_data = nx.DiGraph()
         self.datapaths = {}  # Store datapaths for later access
+        # Shortest paths are computed lazily, one source switch at a time, and cached until the topology
+        # changes. A link event only bumps the version and drops the cache, so a burst of events while
+        # a fabric comes up costs O(1) each and nothing is recomputed until a path is asked for.
+        self.topology_version = 0
+        self.paths = {}  # src dpid -> {dst dpid: path}, valid for topology_version
+        self.flows = FlowProgrammer()
+        # Request key -> {'vnr_id', 'flows', 'seconds', 'complete'} from flush to the last barrier reply.
+        # Keyed by the request, since VNR ids repeat across VNR files, algorithms and runs.
+        self.vnr_latency = {}
+        # VNR paths pushed before one of their hosts was located: MAC of the missing host ->
+        # [(request, vnr_id, path entry)], installed from handle_packet_in when that host is first seen
+        self.waiting_paths = {}
+        kwargs['wsgi'].register(VNEController, {REST_APP: self})
 
     @set_ev_cls(ofp_event.EventOFPSwitchFeatures, CONFIG_DISPATCHER)
     def switch_features_handler(self, ev):
@@ -27,34 +196,112 @@ class SPBSwitch(app_manager.RyuApp):
 
         # Send unknown packets to the controller
         actions = [parser.OFPActionOutput(ofproto.OFPP_CONTROLLER, ofproto.OFPCML_NO_BUFFER)]
+        for done in self.flows.forget(datapath.id):
+            self.batch_done(done)
         self.add_flow(datapath, 0, match, actions)
+        self.flows.flush()
         self.datapaths[datapath.id] = datapath  # Store datapath for future use
 
-    def add_flow(self, datapath, priority, match, actions, buffer_id=None):
-        ofproto = datapath.ofproto
-        parser = datapath.ofproto_parser
-        inst = [parser.OFPInstructionActions(ofproto.OFPIT_APPLY_ACTIONS, actions)]
-        if buffer_id:
-            mod = parser.OFPFlowMod(datapath=datapath, buffer_id=buffer_id, priority=priority,
-                                    match=match, instructions=inst)
+    def add_flow(self, datapath, priority, match, actions, buffer_id=None, ports=()):
+        # Queued; sent with the rest of the batch by self.flows.flush()
+        self.flows.add(datapath, priority, match, actions, buffer_id, ports)
+
+    @set_ev_cls(ofp_event.EventOFPBarrierReply, MAIN_DISPATCHER)
+    def barrier_reply_handler(self, ev):
+        done = self.flows.barrier_reply(ev.msg.datapath.id, ev.msg.xid)
+        if done is not None:
+            self.batch_done(done)
+
+    def batch_done(self, done):
+        (request, vnr_id), flows, seconds, complete = done
+        self.vnr_latency[request] = {'vnr_id': vnr_id, 'flows': flows, 'seconds': seconds, 'complete': complete}
+        if complete:
+            self.logger.info("VNR %s (%s): %d flow-mods installed in %.1f ms", vnr_id, request, flows,
+                             seconds * 1000)
         else:
-            mod = parser.OFPFlowMod(datapath=datapath, priority=priority, match=match, instructions=inst)
-        datapath.send_msg(mod)
+            self.logger.info("VNR %s (%s): %d flow-mods sent, not confirmed by every switch after %.1f ms",
+                             vnr_id, request, flows, seconds * 1000)
 
     @set_ev_cls(event.EventLinkAdd)
     def link_add_handler(self, ev):
         src = ev.link.src
         dst = ev.link.dst
+        if (self.topology_data.has_edge(src.dpid, dst.dpid)
+                and self.topology_data[src.dpid][dst.dpid]['port'] == src.port_no):
+            return  # Rediscovered link, the paths are unchanged
         self.topology_data.add_edge(src.dpid, dst.dpid, port=src.port_no)
         self.topology_data.add_edge(dst.dpid, src.dpid, port=dst.port_no)
-        self.recompute_paths()
+        for port in ((src.dpid, src.port_no), (dst.dpid, dst.port_no)):
+            self.link_ports.add(port)
+            for mac in [mac for mac, location in self.hosts.items() if location == port]:
+                del self.hosts[mac]  # Learned on this port before the link was discovered
+        self.topology_changed()
+
+    @set_ev_cls(event.EventLinkDelete)
+    def link_delete_handler(self, ev):
+        src = ev.link.src
+        dst = ev.link.dst
+        removed = False
+        for dpid, port in ((src.dpid, src.port_no), (dst.dpid, dst.port_no)):
+            self.port_down(dpid, port)
+        for u, v in ((src.dpid, dst.dpid), (dst.dpid, src.dpid)):
+            if self.topology_data.has_edge(u, v):
+                self.topology_data.remove_edge(u, v)
+                removed = True
+        if removed:
+            self.topology_changed()
 
-    def recompute_paths(self):
-        # Compute all shortest paths in the topology
-        self.paths = dict(nx.all_pairs_dijkstra_path(self.topology_data))
+    @set_ev_cls(event.EventSwitchLeave)
+    def switch_leave_handler(self, ev):
+        dpid = ev.switch.dp.id
+        self.datapaths.pop(dpid, None)
+        for done in self.flows.forget(dpid):
+            self.batch_done(done)
+        self.link_ports = {port for port in self.link_ports if port[0] != dpid}
+        if dpid in self.topology_data:
+            for neighbor in list(self.topology_data.predecessors(dpid)):
+                self.port_down(neighbor, self.topology_data[neighbor][dpid]['port'])
+            self.topology_data.remove_node(dpid)
+            self.topology_changed()
+
+    def port_down(self, dpid, port):
+        # An inter-switch link on (dpid, port) is gone: flows still forwarding over it would black-hole
+        # their traffic, so they are deleted and the next packet of it is routed around the link
+        self.link_ports.discard((dpid, port))
+        if dpid in self.datapaths:
+            removed = self.flows.remove_port(self.datapaths[dpid], port)
+            if removed:
+                self.logger.info("Switch %s port %s: %d flows over the lost link deleted", dpid, port, removed)
+
+    def topology_changed(self):
+        self.topology_version += 1
+        self.paths = {}
+
+    def get_path(self, src_dpid, dst_dpid):
+        # Shortest path between two switches, computed for the whole source switch on first use
+        if src_dpid not in self.paths:
+            if src_dpid not in self.topology_data:
+                return None
+            self.paths[src_dpid] = nx.single_source_dijkstra_path(self.topology_data, src_dpid)
+        return self.paths[src_dpid].get(dst_dpid)
 
     @set_ev_cls(ofp_event.EventOFPPacketIn, MAIN_DISPATCHER)
     def _packet_in_handler(self, ev):
+        self.handle_packet_in(ev)
+        self.flows.flush()  # One batch (and barrier) per switch for all flows this packet caused
+        self.sweep_arp()
+
+    def sweep_arp(self, now=None):
+        # The ARP state only grows on packet-ins, so sweeping from here bounds it by the addresses seen
+        # within the last ARP_SWEEP seconds (plus the cache TTL)
+        now = time.time() if now is None else now
+        if now - self.arp_swept < ARP_SWEEP:
+            return
+        self.arp_swept = now
+        self.arp_requested = {ip: sent for ip, sent in self.arp_requested.items() if now - sent < ARP_HOLD_DOWN}
+        self.arp_cache.evict(now)
+
+    def handle_packet_in(self, ev):
         msg = ev.msg
         datapath = msg.datapath
         ofproto = datapath.ofproto
@@ -70,6 +317,10 @@ class SPBSwitch(app_manager.RyuApp):
 
         self.mac_to_port.setdefault(dpid, {})
         self.mac_to_port[dpid][src] = in_port  # Learn MAC address
+        if (dpid, in_port) not in self.link_ports:
+            self.hosts[src] = (dpid, in_port)
+            if src in self.waiting_paths:
+                self.install_waiting_paths(src)
 
         # If the packet is ARP, handle ARP request/reply
         if eth_type == ether_types.ETH_TYPE_ARP:
@@ -92,7 +343,7 @@ class SPBSwitch(app_manager.RyuApp):
         # Install a flow to avoid future packet_in events
         if out_port != ofproto.OFPP_FLOOD:
             match = parser.OFPMatch(in_port=in_port, eth_dst=dst, eth_src=src)
-            self.add_flow(datapath, 1, match, actions)
+            self.add_flow(datapath, 1, match, actions, ports=(in_port, out_port))
 
         # Send the packet out
         data = msg.data if msg.buffer_id == ofproto.OFP_NO_BUFFER else None
@@ -104,74 +355,194 @@ class SPBSwitch(app_manager.RyuApp):
         ip_pkt = pkt.get_protocol(ipv4.ipv4)
         if ip_pkt:
             src_dpid = datapath.id
-            dst_dpid = self.get_host_location(eth.dst)
-            if dst_dpid is None:
+            if (src_dpid, in_port) not in self.link_ports:
+                self.arp_cache.learn(ip_pkt.src, eth.src)
+            location = self.get_host_location(eth.dst)
+            if location is None:
                 return
 
             # Find the path between source and destination
-            path = self.paths.get(src_dpid, {}).get(dst_dpid, None)
+            path = self.get_path(src_dpid, location[0])
             if path:
                 self.install_path_flows(path, in_port, eth)
 
     def install_path_flows(self, path, in_port, eth):
-        # Install flows along the path
-        for i in range(len(path) - 1):
-            current_dpid = path[i]
-            next_dpid = path[i + 1]
-            current_switch = self.datapaths[current_dpid]
-            out_port = self.topology_data[current_dpid][next_dpid]['port']
-            actions = [current_switch.ofproto_parser.OFPActionOutput(out_port)]
-            match = current_switch.ofproto_parser.OFPMatch(in_port=in_port, eth_dst=eth.dst, eth_src=eth.src)
-            self.add_flow(current_switch, 100, match, actions)
+        self.install_path(path, eth.src, eth.dst, in_port)
+
+    def install_path(self, path, src_mac, dst_mac, in_port=None, priority=100):
+        # Installs src_mac -> dst_mac flows on every switch of path (a list of dpids), each matching the
+        # port the traffic enters that switch on, and the last one delivering to the host's port.
+        # in_port=None matches any ingress port on the first switch. Returns False if a hop is unknown.
+        destination = self.hosts.get(dst_mac)
+        if destination is None or destination[0] != path[-1]:
+            return False
+        if any(dpid not in self.datapaths for dpid in path) or \
+                any(not self.topology_data.has_edge(u, v) for u, v in zip(path, path[1:])):
+            return False
+        for i, dpid in enumerate(path):
+            switch = self.datapaths[dpid]
+            parser = switch.ofproto_parser
+            out_port = self.topology_data[dpid][path[i + 1]]['port'] if i + 1 < len(path) else destination[1]
+            hop_in_port = in_port if i == 0 else self.topology_data[dpid][path[i - 1]]['port']
+            if hop_in_port is None:
+                match = parser.OFPMatch(eth_dst=dst_mac, eth_src=src_mac)
+            else:
+                match = parser.OFPMatch(in_port=hop_in_port, eth_dst=dst_mac, eth_src=src_mac)
+            self.add_flow(switch, priority, match, [parser.OFPActionOutput(out_port)], ports=(hop_in_port, out_port))
+        return True
+
+    def install_vnr_paths(self, vnr_id, paths, request=None):
+        # Proactive installation of an embedded VNR's substrate paths, both directions. Each path is
+        # {'src_mac', 'dst_mac', 'src_ip', 'dst_ip', 'dpids'}; paths that cannot be installed yet are
+        # reported back as unresolved, and those waiting for a host to be located are installed once it is.
+        # The flow-mods go out as one batch; the barrier replies give the installation latency, kept
+        # under the request key (unique per push; one is made up if the client sent none).
+        request = request or uuid.uuid4().hex
+        installed, unresolved = 0, []
+        for entry in paths:
+            for key in ('src', 'dst'):
+                if entry.get(key + '_ip'):
+                    self.arp_cache.learn(entry[key + '_ip'], entry[key + '_mac'], static=True)
+            if self.install_vnr_path(entry):
+                installed += 1
+            else:
+                unresolved.append(entry)
+                self.wait_for_hosts(request, vnr_id, entry)
+        flows = self.flows.flush(tag=(request, vnr_id))
+        if flows == 0:  # Nothing new to wait for
+            self.vnr_latency[request] = {'vnr_id': vnr_id, 'flows': 0, 'seconds': 0.0, 'complete': True}
+        self.logger.info("VNR %s (%s): %d paths installed (%d flow-mods), %d unresolved", vnr_id, request,
+                         installed, flows, len(unresolved))
+        return {'request': request, 'vnr_id': vnr_id, 'installed': installed, 'flow_mods': flows,
+                'unresolved': unresolved}
+
+    def install_vnr_path(self, entry):
+        dpids = [int(dpid) for dpid in entry['dpids']]
+        return self.install_path(dpids, entry['src_mac'], entry['dst_mac']) and \
+            self.install_path(dpids[::-1], entry['dst_mac'], entry['src_mac'])
+
+    def wait_for_hosts(self, request, vnr_id, entry):
+        # Queues the entry under a host of it that has not been located; False if both have been
+        for mac in (entry['src_mac'], entry['dst_mac']):
+            if mac not in self.hosts:
+                self.waiting_paths.setdefault(mac, []).append((request, vnr_id, entry))
+                return True
+        return False
+
+    def install_waiting_paths(self, mac):
+        # mac has just been located: installs the VNR paths that waited for it, each request's flows as a
+        # batch of its own, whose barrier replies then give that request's latency record
+        for request, vnr_id, entry in self.waiting_paths.pop(mac):
+            if self.install_vnr_path(entry):
+                flows = self.flows.flush(tag=(request, vnr_id))
+                self.logger.info("VNR %s (%s): path %s <-> %s installed once located (%d flow-mods)", vnr_id,
+                                 request, entry['src_mac'], entry['dst_mac'], flows)
+            elif not self.wait_for_hosts(request, vnr_id, entry):
+                self.logger.info("VNR %s (%s): path %s <-> %s still cannot be installed, dropped", vnr_id, request,
+                                 entry['src_mac'], entry['dst_mac'])
 
     def handle_arp(self, datapath, in_port, pkt, eth):
         arp_pkt = pkt.get_protocol(arp.arp)
         if arp_pkt:
+            if (datapath.id, in_port) not in self.link_ports:
+                self.arp_cache.learn(arp_pkt.src_ip, arp_pkt.src_mac)  # Requests and replies both tell us
             if arp_pkt.opcode == arp.ARP_REQUEST:
-                self.process_arp_request(datapath, in_port, arp_pkt, eth)
+                self.process_arp_request(datapath, in_port, arp_pkt, eth, pkt.data)
             elif arp_pkt.opcode == arp.ARP_REPLY:
-                self.process_arp_reply(datapath, in_port, arp_pkt, eth)
+                self.process_arp_reply(datapath, in_port, arp_pkt, eth, pkt.data)
 
-    def process_arp_request(self, datapath, in_port, arp_pkt, eth):
+    def process_arp_request(self, datapath, in_port, arp_pkt, eth, data):
         # Check if we know the MAC for the destination IP
-        if arp_pkt.dst_ip in self.ip_to_mac:
-            dst_mac = self.ip_to_mac[arp_pkt.dst_ip]
+        dst_mac = self.arp_cache.lookup(arp_pkt.dst_ip)
+        if dst_mac is not None:
             arp_reply = self.create_arp_reply(arp_pkt, eth.src, dst_mac)
             self.send_packet(datapath, in_port, arp_reply)
-        else:
-            self.flood(datapath, in_port, arp_pkt)
+            return
+        now = time.time()
+        if now - self.arp_requested.get(arp_pkt.dst_ip, 0) < ARP_HOLD_DOWN:
+            return  # Already asked; the reply will be learned and later requests answered
+        self.arp_requested[arp_pkt.dst_ip] = now
+        self.send_to_host_ports(data, exclude=(datapath.id, in_port))
 
-    def process_arp_reply(self, datapath, in_port, arp_pkt, eth):
-        # Learn the IP-MAC mapping
-        self.ip_to_mac[arp_pkt.src_ip] = eth.src
+    def process_arp_reply(self, datapath, in_port, arp_pkt, eth, data):
+        # Learned in handle_arp; deliver the reply straight to the requester's port
+        self.arp_requested.pop(arp_pkt.src_ip, None)
+        location = self.hosts.get(eth.dst)
+        if location is not None and location[0] in self.datapaths:
+            self.send_packet(self.datapaths[location[0]], location[1], data)
 
     def create_arp_reply(self, arp_request, src_mac, dst_mac):
-        arp_reply = arp.arp(opcode=arp.ARP_REPLY,
-                            src_mac=dst_mac,
-                            src_ip=arp_request.dst_ip,
-                            dst_mac=src_mac,
-                            dst_ip=arp_request.src_ip)
-        return arp_reply
-
-    def send_packet(self, datapath, port, pkt):
+        # Full ethernet + ARP frame from the target (dst_mac) back to the requester (src_mac)
+        arp_reply = packet.Packet()
+        arp_reply.add_protocol(ethernet.ethernet(ethertype=ether_types.ETH_TYPE_ARP, dst=src_mac, src=dst_mac))
+        arp_reply.add_protocol(arp.arp(opcode=arp.ARP_REPLY,
+                                       src_mac=dst_mac,
+                                       src_ip=arp_request.dst_ip,
+                                       dst_mac=src_mac,
+                                       dst_ip=arp_request.src_ip))
+        arp_reply.serialize()
+        return arp_reply.data
+
+    def send_packet(self, datapath, port, data):
         ofproto = datapath.ofproto
         parser = datapath.ofproto_parser
         actions = [parser.OFPActionOutput(port)]
-        out = parser.OFPPacketOut(datapath=datapath, actions=actions, data=pkt.data)
+        out = parser.OFPPacketOut(datapath=datapath, buffer_id=ofproto.OFP_NO_BUFFER, in_port=ofproto.OFPP_CONTROLLER,
+                                  actions=actions, data=data)
         datapath.send_msg(out)
 
-    def flood(self, datapath, in_port, data):
-        ofproto = datapath.ofproto
-        parser = datapath.ofproto_parser
-        for p in datapath.ports.keys():
-            if p != in_port:
-                actions = [parser.OFPActionOutput(p)]
-                out = parser.OFPPacketOut(datapath=datapath, actions=actions, data=data)
+    def send_to_host_ports(self, data, exclude=None):
+        # Every switch port that is not an inter-switch link, i.e. where hosts can be attached
+        for dpid, datapath in self.datapaths.items():
+            actions = [datapath.ofproto_parser.OFPActionOutput(port) for port in datapath.ports
+                       if port <= datapath.ofproto.OFPP_MAX and (dpid, port) not in self.link_ports
+                       and (dpid, port) != exclude]
+            if actions:
+                ofproto = datapath.ofproto
+                out = datapath.ofproto_parser.OFPPacketOut(datapath=datapath, buffer_id=ofproto.OFP_NO_BUFFER,
+                                                           in_port=ofproto.OFPP_CONTROLLER, actions=actions, data=data)
                 datapath.send_msg(out)
 
-    def get_host_location(self, mac):
-        # Look up the switch DPID where the MAC is located
-        for dpid, mac_table in self.mac_to_port.items():
-            if mac in mac_table:
-                return dpid
-        return None
+    def seed_arp(self, entries):
+        # {ip: mac} known from the substrate, e.g. pushed by manager.py before embedding
+        for ip, mac in entries.items():
+            self.arp_cache.learn(ip, mac, static=True)
+        return {'entries': len(entries)}
+
+    def get_host_location(self, host):
+        # (edge dpid, port) of a host given by MAC or IP address, None if it has not been seen yet
+        return self.hosts.get(self.arp_cache.lookup(host) or host)
+
+
+class VNEController(ControllerBase):
+    # REST API for manager.py: POST /vne/paths with {'request': ..., 'vnr_id': ..., 'paths': [...]}, see
+    # install_vnr_paths,
+    # POST /vne/arp with {'entries': {ip: mac}} and GET /vne/latency
+    def __init__(self, req, link, data, **config):
+        super(VNEController, self).__init__(req, link, data, **config)
+        self.app = data[REST_APP]
+
+    @route('vne', '/vne/paths', methods=['POST'])
+    def push_paths(self, req, **kwargs):
+        try:
+            body = json.loads(req.body)
+        except ValueError:
+            return Response(status=400, text='Invalid JSON')
+        result = self.app.install_vnr_paths(body.get('vnr_id'), body.get('paths', []), body.get('request'))
+        return Response(content_type='application/json', charset='utf-8', text=json.dumps(result))
+
+    @route('vne', '/vne/arp', methods=['POST'])
+    def seed_arp(self, req, **kwargs):
+        try:
+            body = json.loads(req.body)
+        except ValueError:
+            return Response(status=400, text='Invalid JSON')
+        result = self.app.seed_arp(body.get('entries', {}))
+        return Response(content_type='application/json', charset='utf-8', text=json.dumps(result))
+
+    @route('vne', '/vne/latency', methods=['GET'])
+    def latency(self, req, **kwargs):
+        # Flow installation latency per request key, for every batch all of whose switches have replied
+        # or gone ('complete' False if some never confirmed theirs)
+        result = dict(self.app.vnr_latency)
+        return Response(content_type='application/json', charset='utf-8', text=json.dumps(result))
@@ -1,55 +1,108 @@
 import pickle
 import argparse
-import random
 import numpy as np
-from randomPoissonDistribution import randomPoissonNumber_rand as randomPoissonNumber
+from randomPoissonDistribution import truncated_poisson
+import workload_store
 
-def generate_vne_requests(num_requests, vm_range, cpu_range, bw_range, ch):
-    vne_requests = []
+# VNRs are generated in bulk with a numpy Generator: each kind of draw (VM counts, VM CPU cores, link
+# counts, bandwidths) is one vectorized call for the whole batch. A batch is kept in CSR form: the VMs
+# of request p are vm_cpu[vm_offsets[p]:vm_offsets[p + 1]] and its links are
+# link_src/link_dst/bandwidth[link_offsets[p]:link_offsets[p + 1]].
+
+
+def vnr_rng(distribution, size, replica=0, seed=0):
+    # One independent, reproducible stream per (distribution, size, replica) cell; seed=None draws fresh entropy
+    return np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(distribution, size, replica)))
+
+
+def _draw(rng, low, high, count, ch):
+    if ch == 1:  # Integers in [low, high], like random.randint
+        return rng.integers(low, np.asarray(high) + 1, count)
+    elif ch == 2:  # Truncated uniform floats, like int(random.uniform(low, high))
+        return np.floor(rng.uniform(low, high, count)).astype(np.int64)
+    elif ch == 3:
+        samples = rng.normal(np.mean([low, high]), np.std([low, high]), count)
+        return np.maximum(1, np.trunc(samples)).astype(np.int64)
+    elif ch == 4:
+        return truncated_poisson(low, high, 0.4, count, rng)
+    raise ValueError("Invalid choice for generating VNR")
+
+
+def _pair(m, k):
+    # Inverse of the row-major index k of the VM pair (i, j), i < j, among the m * (m - 1) / 2 pairs of m VMs
+    b = 2 * m - 1
+    i = np.floor((b - np.sqrt(b * b - 8 * k)) / 2).astype(np.int64)
+    i = np.where(i * (b - i) // 2 > k, i - 1, i)  # Correct for rounding of the square root
+    i = np.where((i + 1) * (b - i - 1) // 2 <= k, i + 1, i)
+    return i, k - i * (b - i) // 2 + i + 1
+
+
+def generate_vnr_batch(num_requests, vm_range, cpu_range, bw_range, ch, rng=None):
+    if ch not in (1, 2, 3, 4):
+        raise ValueError("Invalid choice for generating VNR")
+    rng = np.random.default_rng() if rng is None else rng
 
-    for p in range(num_requests):
-        if ch == 1:
-            num_vms = random.randint(*vm_range)
-            vm_cpu_cores = [random.randint(*cpu_range) for _ in range(num_vms)]
-        elif ch == 2:
-            num_vms = int(random.uniform(*vm_range))
-            vm_cpu_cores = [int(random.uniform(*cpu_range)) for _ in range(num_vms)]
-        elif ch == 3:
-            num_vms = max(1, int(np.random.normal(np.mean(vm_range), np.std(vm_range))))
-            vm_cpu_cores = [max(1, int(np.random.normal(np.mean(cpu_range), np.std(cpu_range)))) for _ in range(num_vms)]
-        elif ch == 4:
-            num_vms = int(randomPoissonNumber(vm_range[0], vm_range[1], 0.4))
-            vm_cpu_cores = [int(randomPoissonNumber(cpu_range[0], cpu_range[1], 0.4)) for _ in range(num_vms)]
-        else:
-            raise ValueError("Invalid choice for generating VNR")
-
-        lst = [(i, j) for i in range(num_vms) for j in range(i + 1, num_vms)]
-        y = (num_vms * (num_vms - 1)) / 2
-        x = random.randint(num_vms - 1, y) if ch == 1 else int(random.uniform(num_vms - 1, y))
-        vm_links = random.sample(lst, x)
-        bandwidth_values = [random.randint(*bw_range) for _ in range(len(vm_links))] if ch == 1 else [int(random.uniform(*bw_range)) for _ in range(len(vm_links))]
-
-        vne_request = {
-            'num_vms': num_vms,
-            'vm_cpu_cores': vm_cpu_cores,
-            'vm_links': vm_links,
-            'bandwidth_values': bandwidth_values,
+    num_vms = _draw(rng, vm_range[0], vm_range[1], num_requests, ch)
+    vm_offsets = np.concatenate(([0], np.cumsum(num_vms)))
+    vm_cpu = _draw(rng, cpu_range[0], cpu_range[1], int(vm_offsets[-1]), ch)
+
+    # Between a spanning number of links (m - 1) and all m * (m - 1) / 2 pairs; only ch 1 draws integers here
+    pairs = num_vms * (num_vms - 1) // 2
+    link_ch = 1 if ch == 1 else 2
+    num_links = np.clip(_draw(rng, np.maximum(num_vms - 1, 0), pairs, num_requests, link_ch), 0, pairs)
+    link_offsets = np.concatenate(([0], np.cumsum(num_links)))
+
+    # Distinct pair indices for all requests at once: every pair index of a request gets a random key and
+    # the request keeps its num_links pairs with the smallest keys. Sorting on (request, key) keeps the
+    # pairs of a request together, so a pair's rank within its request is its position minus the
+    # request's first position. Memory is one key per pair (num_links is at least a fraction of pairs).
+    pair_offsets = np.concatenate(([0], np.cumsum(pairs)))
+    request = np.repeat(np.arange(num_requests, dtype=np.int64), pairs)
+    order = np.argsort((request << 32) | rng.integers(0, 1 << 32, request.size, dtype=np.int64))
+    rank = np.arange(request.size) - pair_offsets[request]
+    chosen = order[rank < num_links[request]]
+    index = chosen - pair_offsets[request[chosen]]
+    link_src, link_dst = _pair(np.repeat(num_vms, num_links), index)
+    bandwidth = _draw(rng, bw_range[0], bw_range[1], index.size, link_ch)
+
+    return {'vm_offsets': vm_offsets, 'vm_cpu': vm_cpu, 'link_offsets': link_offsets,
+            'link_src': link_src, 'link_dst': link_dst, 'bandwidth': bandwidth}
+
+
+def batch_to_requests(batch):
+    # The list of per-request dicts that the embedding algorithms read
+    vm_offsets, link_offsets = batch['vm_offsets'].tolist(), batch['link_offsets'].tolist()
+    vm_cpu, bandwidth = batch['vm_cpu'].tolist(), batch['bandwidth'].tolist()
+    links = list(zip(batch['link_src'].tolist(), batch['link_dst'].tolist()))
+    vne_requests = []
+    for p in range(len(vm_offsets) - 1):
+        vne_requests.append({
+            'num_vms': vm_offsets[p + 1] - vm_offsets[p],
+            'vm_cpu_cores': vm_cpu[vm_offsets[p]:vm_offsets[p + 1]],
+            'vm_links': links[link_offsets[p]:link_offsets[p + 1]],
+            'bandwidth_values': bandwidth[link_offsets[p]:link_offsets[p + 1]],
             'vnr_id': p
-        }
+        })
+    return vne_requests
 
-        vne_requests.append(vne_request)
 
-        # Print the output for the current VNE request
-        print(f"\nRequest {len(vne_requests)}:")
-        print(f"  Number of VMs: {num_vms}")
-        print(f"  VM CPU Cores: {vm_cpu_cores}")
+def print_vne_requests(vne_requests):
+    for vne_request in vne_requests:
+        print(f"\nRequest {vne_request['vnr_id'] + 1}:")
+        print(f"  Number of VMs: {vne_request['num_vms']}")
+        print(f"  VM CPU Cores: {vne_request['vm_cpu_cores']}")
         print("  Virtual Links established:")
-        for i, link in enumerate(vm_links, 1):
+        for i, link in enumerate(vne_request['vm_links'], 1):
             print(f"    Link {i}: VM{link[0]} - VM{link[1]}")
         print("  Virtual Links Bandwidth Demand:")
-        for i, bandwidth in enumerate(bandwidth_values, 1):
+        for i, bandwidth in enumerate(vne_request['bandwidth_values'], 1):
             print(f"    Link {i}: {bandwidth}")
 
+
+def generate_vne_requests(num_requests, vm_range, cpu_range, bw_range, ch, rng=None, verbose=False):
+    vne_requests = batch_to_requests(generate_vnr_batch(num_requests, vm_range, cpu_range, bw_range, ch, rng))
+    if verbose:
+        print_vne_requests(vne_requests)
     return vne_requests
 
 def save_vne_requests_to_pickle(vne_requests, output_file):
@@ -59,17 +112,26 @@ def save_vne_requests_to_pickle(vne_requests, output_file):
 def main():
     parser = argparse.ArgumentParser(description='Virtual Network Embedding Generator')
     parser.add_argument('mininet_pickle_file', help='Path to the Mininet pickle file')
-    parser.add_argument('output_file', help='Output path for the VNE requests pickle file')
+    parser.add_argument('output_file', help='Output path for the VNE requests pickle file, or a columnar store if it ends in .cols')
     parser.add_argument('num_requests', type=int, help='Number of VNE requests')
     parser.add_argument('vm_range', nargs=2, type=int, help='Number of VMs range')
     parser.add_argument('cpu_range', nargs=2, type=int, help='CPU core range for each VM')
     parser.add_argument('bw_range', nargs=2, type=int, help='Bandwidth range between VMs')  # Use int type for bandwidth
     parser.add_argument('ch', type=str, help='choice for the generating vnr')
+    parser.add_argument('--seed', type=int, help='Base seed; the same seed and replica reproduce the same VNRs')
+    parser.add_argument('--replica', type=int, default=0, help='Replica number of this (distribution, size) cell')
+    parser.add_argument('--verbose', action='store_true', help='Print every generated VNR')
     args = parser.parse_args()
     ch = int(args.ch)
-    vne_requests = generate_vne_requests(args.num_requests, args.vm_range, args.cpu_range, args.bw_range, ch)
+    rng = vnr_rng(ch, args.num_requests, args.replica, args.seed)
+    batch = generate_vnr_batch(args.num_requests, args.vm_range, args.cpu_range, args.bw_range, ch, rng)
+    if args.verbose:
+        print_vne_requests(batch_to_requests(batch))
 
-    save_vne_requests_to_pickle(vne_requests, args.output_file)
+    if args.output_file.endswith(workload_store.SUFFIX):
+        workload_store.save_vnr_batch(args.output_file, batch)
+    else:
+        save_vne_requests_to_pickle(batch_to_requests(batch), args.output_file)
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,45 @@
+import numpy as np
+
+# Admission control: cheap necessary conditions for a VNR to be embeddable, checked before the full node
+# and link mapping. A VNR that fails one cannot be embedded, so it is rejected without touching the
+# state; one that passes may still fail in the mapping. The conditions assume the rules of
+# Energy_Load_Math: every VM of a VNR goes to a different server, and a virtual link between two VMs
+# is a path between their servers that starts and ends on the servers' links.
+# Algorithms with the same rules expose them as `admission_check = admission.check`, which
+# manager.run_embedding calls before embedding.
+
+
+def check(state, vnr):
+    # Reason the VNR cannot be embedded in the current state, or None if it passes every check
+    demand = {}  # VM -> bandwidth of its virtual links
+    for (vm_source, vm_target), bandwidth in zip(vnr['vm_links'], vnr['bandwidth_values']):
+        if vm_source != vm_target:
+            demand[vm_source] = demand.get(vm_source, 0) + bandwidth
+            demand[vm_target] = demand.get(vm_target, 0) + bandwidth
+    if not demand:
+        return None  # Only VMs with virtual links decide the outcome of the embedding
+    vms = len(demand)
+    servers = len(state.server_ids)
+    if vms > servers:
+        return f"{vms} linked VMs but only {servers} servers"
+
+    cpu = np.array([vnr['vm_cpu_cores'][vm] for vm in demand], dtype=float)
+    if cpu.sum() > state.total_cpu():
+        return f"CPU demand {cpu.sum():g} exceeds the residual CPU {state.total_cpu():g}"
+    reason = _dominated(cpu, state.cpu, 'CPU')
+    if reason:
+        return reason
+    return _dominated(np.fromiter(demand.values(), dtype=float, count=vms), state.uplink, 'bandwidth')
+
+
+def _dominated(demands, residuals, resource):
+    # With one VM per server, the i-th largest demand needs a server whose residual is at least as
+    # large, i.e. the demands sorted in decreasing order must fit the k largest residuals sorted the same way
+    k = len(demands)
+    largest = np.sort(np.partition(residuals, len(residuals) - k)[len(residuals) - k:])[::-1]
+    demands = np.sort(demands)[::-1]
+    short = np.flatnonzero(demands > largest)
+    if short.size:
+        i = int(short[0])
+        return f"fewer than {i + 1} servers with a residual {resource} of {demands[i]:g} or more"
+    return None
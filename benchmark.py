@@ -0,0 +1,231 @@
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+from collections import deque
+import numpy as np
+import manager
+import path_index
+import vne_log
+from substrate import SubstrateState
+
+# Benchmark of the embedding pipeline on synthetic substrates and workloads. For every (hosts, VNRs) case
+# it times, per VNR, the stages of an in-process run: admission control, node mapping and link mapping
+# (Energy_Load_Math) and the manager's bookkeeping (commit or rollback, revenue and cost, departures).
+# VNRs rejected by admission control only count towards the admission stage.
+# It reports p50/p95/p99 latency per stage, throughput and peak traced memory. VNR generation
+# (VNE.generator) is timed on its own. Results can be saved as a baseline; later runs compared against
+# it exit non-zero when a metric regresses by more than the tolerance.
+#
+#   python benchmark.py --profile quick --save-baseline OUTPUT/benchmark-baseline.json
+#   python benchmark.py --profile quick --baseline OUTPUT/benchmark-baseline.json
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+PROFILES = {
+    'quick': {'cases': [(10, 20), (100, 1000), (1000, 1000)], 'generator': [20, 1000, 10000]},
+    'full': {'cases': [(10, 20), (100, 1000), (1000, 10000), (10000, 1000), (10000, 100000)],
+             'generator': [20, 1000, 10000, 100000]},
+}
+STAGES = ('admission', 'node_mapping', 'link_mapping', 'bookkeeping')
+MIN_DELTA_MS = 0.05  # Latency changes smaller than this are timer noise, not regressions
+
+# Same ranges as SN-Input-File.txt and VNE-Input-File.txt
+CPU_RANGE, HOST_BW_RANGE = (20, 100), (50, 100)
+VM_RANGE, VM_CPU_RANGE, VM_BW_RANGE = (2, 5), (1, 10), (1, 5)
+
+
+def synthetic_substrate(num_hosts, seed=0, fanout=8):
+    # Tree of switches over num_hosts hosts, fanout children per switch, whose top level is connected
+    # to two core switches so that core paths have an alternative. Same dict layout as SN/SN.topo.pickle.
+    rng = np.random.default_rng(seed)
+    sn_topology = {f'h{i + 1}': {'allocated_cores': int(cores)}
+                   for i, cores in enumerate(rng.integers(CPU_RANGE[0], CPU_RANGE[1] + 1, num_hosts))}
+    sn_topology['num_hosts'] = num_hosts
+    links = sn_topology['links_details'] = []
+    switches = 0
+    level, bandwidth = [f'h{i + 1}' for i in range(num_hosts)], HOST_BW_RANGE
+    while True:
+        parents = []
+        for start in range(0, len(level), fanout):
+            switches += 1
+            parents.append(f's{switches}')
+            for child in level[start:start + fanout]:
+                links.append({'node1': parents[-1], 'node2': child,
+                              'assigned_bandwidth': int(rng.integers(bandwidth[0], bandwidth[1] + 1))})
+        level, bandwidth = parents, (bandwidth[0] * fanout, bandwidth[1] * fanout)
+        if len(level) <= fanout:
+            break
+    for core in (f's{switches + 1}', f's{switches + 2}'):
+        for child in level:
+            links.append({'node1': core, 'node2': child,
+                          'assigned_bandwidth': int(rng.integers(bandwidth[0], bandwidth[1] + 1))})
+    return sn_topology
+
+
+def percentiles(samples):
+    # Milliseconds
+    samples = np.asarray(samples) * 1000
+    if samples.size == 0:
+        return {'p50': 0.0, 'p95': 0.0, 'p99': 0.0, 'mean': 0.0}
+    p50, p95, p99 = np.percentile(samples, [50, 95, 99])
+    return {'p50': round(float(p50), 4), 'p95': round(float(p95), 4), 'p99': round(float(p99), 4),
+            'mean': round(float(samples.mean()), 4)}
+
+
+def bench_generator(generator, size, seed=0):
+    rng = generator.vnr_rng(1, size, seed)
+    start = time.perf_counter()
+    generator.generate_vnr_batch(size, VM_RANGE, VM_CPU_RANGE, VM_BW_RANGE, 1, rng)
+    seconds = time.perf_counter() - start
+    return {'seconds': round(seconds, 4), 'vnrs_per_s': round(size / seconds, 1)}
+
+
+def embed_workload(algorithm, sn_topology, vnrs, active, index=None):
+    # Embeds vnrs one after another, keeping at most `active` of them embedded (the oldest departs first).
+    # Returns the per-VNR seconds of each stage and the number of accepted VNRs.
+    state = SubstrateState(sn_topology, index)
+    times = {stage: [] for stage in STAGES}
+    allocations = deque()
+    accepted = 0
+    clock = time.perf_counter
+    check = getattr(algorithm, 'admission_check', None)
+    for vnr in vnrs:
+        start = clock()
+        reason = check(state, vnr) if check is not None else None
+        admitted = clock()
+        times['admission'].append(admitted - start)
+        if reason:
+            continue
+        state.begin()
+        start = clock()
+        vm_to_server_assignments, _, _ = algorithm.node_embedding_and_mapping(state, vnr)
+        mapped = clock()
+        embedding_success, _, path_mappings = algorithm.link_embedding_and_mapping(state, vnr,
+                                                                                    vm_to_server_assignments)
+        linked = clock()
+        if all(embedding_success.values()):
+            allocations.append(state.commit())
+            manager.revenue_and_cost(vnr, vm_to_server_assignments, path_mappings)
+            accepted += 1
+            if len(allocations) > active:
+                state.release(allocations.popleft())
+        else:
+            state.rollback()
+        done = clock()
+        times['node_mapping'].append(mapped - start)
+        times['link_mapping'].append(linked - mapped)
+        times['bookkeeping'].append(done - linked)
+    return times, accepted
+
+
+def bench_case(algorithm, generator, num_hosts, num_vnrs, seed=0, memory=True, use_index=False):
+    sn_topology = synthetic_substrate(num_hosts, seed)
+    vnrs = generator.generate_vne_requests(num_vnrs, VM_RANGE, VM_CPU_RANGE, VM_BW_RANGE, 1,
+                                           generator.vnr_rng(1, num_vnrs, seed))
+    active = max(1, num_hosts // 2)
+    index = path_index.build(sn_topology) if use_index else None
+
+    start = time.perf_counter()
+    times, accepted = embed_workload(algorithm, sn_topology, vnrs, active, index)
+    seconds = time.perf_counter() - start
+
+    result = {'hosts': num_hosts, 'vnrs': num_vnrs, 'seconds': round(seconds, 4),
+              'vnrs_per_s': round(num_vnrs / seconds, 1), 'acceptance_ratio': round(accepted / num_vnrs * 100, 2)}
+    for stage in STAGES:
+        result[stage] = percentiles(times[stage])
+    if memory:
+        # Separate pass, tracing slows everything down
+        tracemalloc.start()
+        embed_workload(algorithm, sn_topology, vnrs, active, index)
+        result['peak_memory_mib'] = round(tracemalloc.get_traced_memory()[1] / 2 ** 20, 2)
+        tracemalloc.stop()
+    return result
+
+
+def run(cases, generator_sizes, seed=0, memory=True, use_index=False):
+    algorithm = manager.load_algorithm(os.path.join(HERE, 'Energy_Load_Math.py'))
+    generator = manager.load_algorithm(os.path.join(HERE, 'VNE.generator.py'))
+    results = {'generator': {}, 'cases': {}}
+    for size in generator_sizes:
+        results['generator'][str(size)] = bench_generator(generator, size, seed)
+        print(f"generator {size} VNRs: {results['generator'][str(size)]['vnrs_per_s']} VNRs/s")
+    for num_hosts, num_vnrs in cases:
+        result = bench_case(algorithm, generator, num_hosts, num_vnrs, seed, memory, use_index)
+        results['cases'][f"{num_hosts}x{num_vnrs}"] = result
+        stages = ', '.join(f"{stage} p50/p95/p99 {result[stage]['p50']}/{result[stage]['p95']}/{result[stage]['p99']} ms"
+                           for stage in STAGES)
+        print(f"{num_hosts} hosts x {num_vnrs} VNRs: {result['vnrs_per_s']} VNRs/s, "
+              f"acceptance {result['acceptance_ratio']}%, {stages}"
+              + (f", peak {result['peak_memory_mib']} MiB" if memory else ''))
+    return results
+
+
+def compare(results, baseline, tolerance):
+    # Regressions beyond tolerance (0.2 = 20%) for every case present in both runs
+    regressions = []
+    for size, result in results['generator'].items():
+        before = baseline.get('generator', {}).get(size)
+        if before and result['vnrs_per_s'] < before['vnrs_per_s'] * (1 - tolerance):
+            regressions.append(f"generator {size}: {before['vnrs_per_s']} -> {result['vnrs_per_s']} VNRs/s")
+    for case, result in results['cases'].items():
+        before = baseline.get('cases', {}).get(case)
+        if not before:
+            continue
+        if result['vnrs_per_s'] < before['vnrs_per_s'] * (1 - tolerance):
+            regressions.append(f"{case}: {before['vnrs_per_s']} -> {result['vnrs_per_s']} VNRs/s")
+        for stage in STAGES:
+            if stage not in before:
+                continue  # Baseline from before the stage existed
+            for p in ('p50', 'p95'):
+                if result[stage][p] > before[stage][p] * (1 + tolerance) + MIN_DELTA_MS:
+                    regressions.append(f"{case} {stage} {p}: {before[stage][p]} -> {result[stage][p]} ms")
+        if 'peak_memory_mib' in result and 'peak_memory_mib' in before and \
+                result['peak_memory_mib'] > before['peak_memory_mib'] * (1 + tolerance):
+            regressions.append(f"{case} peak memory: {before['peak_memory_mib']} -> {result['peak_memory_mib']} MiB")
+    return regressions
+
+
+def parse_case(text):
+    hosts, vnrs = text.lower().split('x')
+    return int(hosts), int(vnrs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark VNR generation and the embedding pipeline')
+    parser.add_argument('--profile', choices=sorted(PROFILES), default='quick')
+    parser.add_argument('--case', action='append', type=parse_case,
+                        help='HOSTSxVNRS, e.g. 1000x10000 (repeatable, replaces the profile cases)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--no-memory', action='store_true', help='Skip the tracemalloc pass')
+    parser.add_argument('--path-index', action='store_true', help='Route with a path_index.PathIndex')
+    parser.add_argument('--output', help='Write the results as JSON')
+    parser.add_argument('--save-baseline', help='Write the results as the new baseline JSON')
+    parser.add_argument('--baseline', help='Baseline JSON to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed slowdown before a regression')
+    args = parser.parse_args()
+    vne_log.configure('quiet')
+
+    profile = PROFILES[args.profile]
+    results = run(args.case or profile['cases'], [] if args.case else profile['generator'], args.seed,
+                  not args.no_memory, args.path_index)
+
+    for path in (args.output, args.save_baseline):
+        if path:
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            with open(path, 'w') as file:
+                json.dump(results, file, indent=2)
+    if args.baseline:
+        with open(args.baseline, 'r') as file:
+            regressions = compare(results, json.load(file), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+        print("No regressions against the baseline.")
+
+
+if __name__ == '__main__':
+    main()
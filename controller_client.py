@@ -0,0 +1,86 @@
+import json
+import os
+import urllib.request
+import uuid
+import vne_log
+
+# Pushes embedded VNR paths to the Ryu controller (Ryu/Ryu.py, POST /vne/paths) so their flows are
+# installed proactively instead of on the first packet-in, and seeds its proxy ARP (POST /vne/arp).
+# Substrate names follow Mininet's defaults: switch sN is datapath N, host hN has MAC
+# 00:00:00:00:00:0N (hex) and IP 10.0.0.N.
+# Enabled by setting $VNE_CONTROLLER_URL (manager.py --controller), e.g. http://127.0.0.1:8080.
+# The controller's flows match on host MAC pairs, one path per pair, so split virtual links
+# (multipath.py) cannot be installed: manager.py refuses --split-links together with a controller.
+
+TIMEOUT = 5
+
+
+def controller_url():
+    return os.environ.get('VNE_CONTROLLER_URL') or None
+
+
+def switch_dpid(name):
+    return int(name[1:])
+
+
+def host_mac(name):
+    n = int(name[1:])
+    return ':'.join(f'{(n >> (8 * i)) & 0xff:02x}' for i in reversed(range(6)))
+
+
+def host_ip(name):
+    n = (10 << 24) + int(name[1:])
+    return '.'.join(str((n >> (8 * i)) & 0xff) for i in reversed(range(4)))
+
+
+def vnr_paths(connections):
+    # Controller entries for the (vms, path, bandwidth) connections of one embedded VNR. Paths between
+    # VMs on the same server never leave the host and need no flows.
+    paths = []
+    for vms, path, bandwidth in connections:
+        if isinstance(path, int) or len(path) < 3:
+            continue
+        paths.append({'src_mac': host_mac(path[0]), 'dst_mac': host_mac(path[-1]),
+                      'src_ip': host_ip(path[0]), 'dst_ip': host_ip(path[-1]),
+                      'dpids': [switch_dpid(node) for node in path[1:-1]]})
+    return paths
+
+
+def post(url, path, body):
+    request = urllib.request.Request(url.rstrip('/') + path, data=json.dumps(body).encode(),
+                                     headers={'Content-Type': 'application/json'}, method='POST')
+    with urllib.request.urlopen(request, timeout=TIMEOUT) as response:
+        return json.loads(response.read().decode() or 'null')
+
+
+def seed_arp(url, sn_topology):
+    # Gives the controller's proxy ARP the address of every substrate host, so no ARP is ever flooded
+    entries = {host_ip(f'h{i + 1}'): host_mac(f'h{i + 1}') for i in range(sn_topology['num_hosts'])}
+    try:
+        return post(url, '/vne/arp', {'entries': entries})
+    except (OSError, ValueError) as e:
+        vne_log.warning(f"Could not seed the controller's ARP cache at {url}: {e}")
+        return None
+
+
+def request_key(label=''):
+    # Key of one push, under which the controller reports its latency (GET /vne/latency). VNR ids are
+    # only unique within a VNR file, so the key adds a random part to the caller's label.
+    return f"{label}:{uuid.uuid4().hex}" if label else uuid.uuid4().hex
+
+
+def push_vnr_paths(url, vnr_id, connections, request=None):
+    # Returns the controller's reply, or None if it could not be reached; embedding goes on either way
+    paths = vnr_paths(connections)
+    if not paths:
+        return None
+    request = request or request_key()
+    try:
+        result = post(url, '/vne/paths', {'request': request, 'vnr_id': vnr_id, 'paths': paths})
+    except (OSError, ValueError) as e:
+        vne_log.warning(f"Could not push the paths of VNR {vnr_id} to the controller at {url}: {e}")
+        return None
+    if result and result.get('unresolved'):
+        vne_log.info(f"VNR {vnr_id}: {len(result['unresolved'])} paths not installed yet, "
+                     f"those whose hosts are not located are installed when they are")
+    return result
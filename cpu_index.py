@@ -0,0 +1,82 @@
+from bisect import bisect_left
+import numpy as np
+
+# Index of the servers' residual CPU, kept by SubstrateState (cpu_index) and updated in place on every
+# placement and release. Servers are identified by their position in SubstrateState.server_ids.
+# - a list of (residual, position) kept sorted, for best fit (smallest residual that fits) and the number
+#   of servers that fit by binary search; its positions are mirrored in a numpy array (order) so that
+#   "every server with at least c free cores" is a slice of it;
+# - a max segment tree over positions, for first fit (lowest position that fits) in O(log n).
+# A change moves one entry of the sorted list and of order (a shift of the entries in between) and
+# updates one path of the tree.
+
+
+class ResidualCPUIndex:
+    def __init__(self, cpu):
+        cpu = np.asarray(cpu, dtype=float).tolist()
+        self._sorted = sorted((residual, pos) for pos, residual in enumerate(cpu))
+        self.order = np.array([pos for _, pos in self._sorted], dtype=np.intp)
+        self._size = 1
+        while self._size < len(cpu):
+            self._size *= 2
+        self._tree = [-np.inf] * (2 * self._size)
+        self._tree[self._size:self._size + len(cpu)] = cpu
+        for node in range(self._size - 1, 0, -1):
+            self._tree[node] = max(self._tree[2 * node], self._tree[2 * node + 1])
+
+    def __len__(self):
+        return len(self._sorted)
+
+    def update(self, pos, old, new):
+        old, new = float(old), float(new)
+        if old == new:
+            return
+        i = bisect_left(self._sorted, (old, pos))
+        del self._sorted[i]
+        j = bisect_left(self._sorted, (new, pos))
+        self._sorted.insert(j, (new, pos))
+        order = self.order
+        if j > i:
+            order[i:j] = order[i + 1:j + 1]
+        else:
+            order[j + 1:i + 1] = order[j:i]
+        order[j] = pos
+
+        tree = self._tree
+        node = pos + self._size
+        tree[node] = new
+        node //= 2
+        while node:
+            tree[node] = max(tree[2 * node], tree[2 * node + 1])
+            node //= 2
+
+    def count_at_least(self, cpu):
+        return len(self._sorted) - bisect_left(self._sorted, (cpu, -1))
+
+    def at_least(self, cpu):
+        # Positions of the servers with at least cpu free cores, by residual. A view, valid until the next update.
+        return self.order[bisect_left(self._sorted, (cpu, -1)):]
+
+    def best_fit(self, cpu, excluded=None):
+        # Position of the server with the smallest residual of at least cpu (lowest position on ties), or None.
+        # excluded is an optional boolean array by position of servers to skip.
+        for i in range(bisect_left(self._sorted, (cpu, -1)), len(self._sorted)):
+            pos = self._sorted[i][1]
+            if excluded is None or not excluded[pos]:
+                return pos
+        return None
+
+    def first_fit(self, cpu, start=0):
+        # Lowest position from start on whose residual is at least cpu, or None
+        tree = self._tree
+        node, end = start + self._size, 2 * self._size
+        while node < end:
+            if node & 1:
+                if tree[node] >= cpu:
+                    while node < self._size:
+                        node = 2 * node if tree[2 * node] >= cpu else 2 * node + 1
+                    return node - self._size
+                node += 1
+            node //= 2
+            end //= 2
+        return None
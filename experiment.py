@@ -0,0 +1,142 @@
+import argparse
+import json
+import os
+import pickle
+import manager
+import vne_log
+from metrics import MetricsWriter, export_excel, mapping_dir
+
+# Unattended experiment sweeps: every (algorithm, VNR distribution, number of VNRs, seed) cell of the
+# spec is embedded once. Finished cells are recorded in a checkpoint file, so a restarted sweep only
+# runs the cells that are still missing. Example spec: Experiment-Spec.json.
+
+DEFAULTS = {
+    'substrate': 'SN/SN.topo.pickle',
+    'sn_args_file': 'SN-Input-File.txt',
+    'sn_distribution': 1,
+    'sn_topology': None,  # substrate_generator topology, e.g. "fat-tree:8"; null for the args file's tree
+    'sn_backend': 'builder',  # or "mininet"
+    'vnr_args_file': 'VNE-Input-File.txt',
+    'vnr_dir': 'VNR',
+    'distributions': [1],
+    'sizes': [20],
+    'seeds': list(range(10)),
+    'algorithms': {},
+    'metrics': 'OUTPUT/parameters_output.sqlite',
+    'excel': 'OUTPUT/parameters_output.xlsx',  # Exported from the metrics file at the end, null to skip
+    'checkpoint': 'OUTPUT/sweep.checkpoint.json',
+    'workers': None,
+    'isolate': False,
+}
+
+
+def load_spec(path):
+    with open(path, 'r') as file:
+        spec = dict(DEFAULTS, **json.load(file))
+    if not spec['algorithms']:
+        raise ValueError(f"{path}: 'algorithms' must map algorithm names to their scripts")
+    return spec
+
+
+def vnr_file_name(spec, distribution, size, seed):
+    return os.path.join(spec['vnr_dir'], f"vnr{size}.{seed}.dist{distribution}.topo.pickle")
+
+
+def cell_key(name, distribution, size, seed):
+    return f"{name}|{distribution}|{size}|{seed}"
+
+
+def load_checkpoint(path):
+    if not os.path.exists(path):
+        return set()
+    with open(path, 'r') as file:
+        return set(json.load(file))
+
+
+def save_checkpoint(path, done):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as file:
+        json.dump(sorted(done), file)
+    os.replace(tmp_path, path)  # Atomic, a crash never leaves a truncated checkpoint
+
+
+def generate_workloads(spec):
+    # Generates the VNR files of the grid that do not exist yet, each with its own fixed seed
+    generator = manager.load_algorithm(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'VNE.generator.py'))
+    with open(spec['vnr_args_file'], 'r') as file:
+        args = [int(arg) for arg in file.readline().split()]
+    vm_range, cpu_range, bw_range = args[0:2], args[2:4], args[4:6]
+
+    os.makedirs(spec['vnr_dir'], exist_ok=True)
+    for distribution in spec['distributions']:
+        for size in spec['sizes']:
+            for seed in spec['seeds']:
+                path = vnr_file_name(spec, distribution, size, seed)
+                if os.path.exists(path):
+                    continue
+                rng = generator.vnr_rng(distribution, size, seed)
+                vne_requests = generator.generate_vne_requests(size, vm_range, cpu_range, bw_range, distribution, rng)
+                with open(path + '.tmp', 'wb') as file:
+                    pickle.dump(vne_requests, file)
+                os.replace(path + '.tmp', path)
+                vne_log.info(f"Generated {path}")
+
+
+def pending_jobs(spec, done):
+    jobs = {}
+    for name, script in spec['algorithms'].items():
+        for distribution in spec['distributions']:
+            for size in spec['sizes']:
+                for seed in spec['seeds']:
+                    key = cell_key(name, distribution, size, seed)
+                    if key not in done:
+                        jobs[(script, vnr_file_name(spec, distribution, size, seed), name)] = key
+    return jobs
+
+
+def run_sweep(spec, workers=None, dry_run=False):
+    done = load_checkpoint(spec['checkpoint'])
+    jobs = pending_jobs(spec, done)
+    print(f"{len(done)} cells already done, {len(jobs)} to run.")
+    if dry_run:
+        for key in jobs.values():
+            print(key)
+        return []
+
+    if not os.path.exists(spec['substrate']):
+        manager.execute_substrate_network(spec['sn_args_file'], spec['sn_distribution'], spec['substrate'],
+                                          spec['sn_topology'], spec['sn_backend'])
+    generate_workloads(spec)
+    os.makedirs(os.path.dirname(spec['checkpoint']) or '.', exist_ok=True)
+
+    writer = MetricsWriter(spec['metrics'])
+
+    def on_result(job, data):
+        # The row is flushed before the cell is checkpointed, so a crash never loses a finished cell
+        writer.append(job[2], data)
+        writer.flush()
+        done.add(jobs[job])
+        save_checkpoint(spec['checkpoint'], done)
+        print(f"[{len(done)}] {jobs[job]}: Acceptance Ratio {data['Acceptance Ratio']}, {data['Total Execution Time']}")
+
+    rows = manager.run_batch(spec['substrate'], list(jobs), None, workers or spec['workers'], spec['isolate'],
+                             on_result, mapping_dir(spec['metrics']))
+    if spec['excel'] is not None and os.path.exists(spec['metrics']):
+        export_excel(spec['metrics'], spec['excel'])
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run a VNE experiment sweep from a JSON spec')
+    parser.add_argument('spec', help='Experiment spec, see Experiment-Spec.json')
+    parser.add_argument('--workers', type=int, help='Parallel jobs (overrides the spec)')
+    parser.add_argument('--dry-run', action='store_true', help='Only list the cells that still have to run')
+    parser.add_argument('--log-level', choices=sorted(vne_log.LEVELS), default='quiet')
+    parser.add_argument('--events', help='Append structured JSON-lines events to this file')
+    args = parser.parse_args()
+    vne_log.configure(args.log_level, args.events)
+    run_sweep(load_spec(args.spec), args.workers, args.dry_run)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,73 +1,162 @@
 import subprocess
 import pickle
 import os
+import importlib.util
+import re
 from openpyxl import load_workbook, Workbook
 import json
 import sys
 import time
-
-def execute_substrate_network(args_file, ch):
+import uuid
+import argparse
+import tempfile
+import shutil
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from substrate import SubstrateState
+import vne_log
+import admission
+import workload_store
+import path_index
+import controller_client
+import profiling
+import substrate_generator
+import multipath
+from metrics import MetricsWriter, MetricsAccumulator, mapping_dir, export_excel
+
+def execute_substrate_network(args_file, ch, output_path='SN/SN.topo.pickle', topology=None, backend='builder'):
+    # backend 'builder' writes the substrate with substrate_generator (no Mininet, tree of the args file's
+    # depth and fanout unless another topology is given); 'mininet' runs the Mininet emulation script
+    if backend == 'builder':
+        substrate_generator.generate(args_file, ch, output_path, topology)
+        return
     with open(args_file, 'r') as file:
         arguments = file.readline().strip().split()
     arguments.append(str(ch))
-    arguments.append("SN/SN.topo.pickle")
-    print("\nExecuting Substrate Network with arguments:", arguments)
+    arguments.append(output_path)
+    vne_log.info("\nExecuting Substrate Network with arguments:", arguments)
     mininet_script_path = '/media/sdn/New Volume/PyCharm Projects - ubuntu/Framework-3.7/mininet/Mininet.py'
     env = os.environ.copy()
     env[
         'PYTHONPATH'] = "/media/sdn/New Volume/PyCharm Projects - ubuntu/Framework-3.7/.venv/lib/python3.7/site-packages"
     python_exec = "/media/sdn/New Volume/PyCharm Projects - ubuntu/Framework-3.7/.venv/bin/python"
     command = ['sudo', '-S', sys.executable, mininet_script_path] + arguments
-    print("Running command:", " ".join(command))
+    vne_log.info("Running command:", " ".join(command))
     subprocess.run(command, env=env)
-    print("\nSubstrate Network Execution Completed.\n")
+    vne_log.info("\nSubstrate Network Execution Completed.\n")
 
 def execute_vnr_generator(args_file, vnr_gen_ch, sn_vm_gen_ch, vnr_file, sz):
     with open(args_file, 'r') as file:
         arguments = file.readline().strip().split()
     python_exec = "/media/sdn/New Volume/PyCharm Projects - ubuntu/Framework-3.7/.venv/bin/python"
-    print("Executing VNR with arguments", arguments)
+    vne_log.info("Executing VNR with arguments", arguments)
     subprocess.run(
         [python_exec, "mininet/VNE.generator.py", "SN/SN.topo.pickle", vnr_file, sz] + arguments + [vnr_gen_ch])
-    print("VNR execution completed.")
+    vne_log.info("VNR execution completed.")
+
+_loaded_algorithms = {}
+
+def load_algorithm(algo):
+    # Import an algorithm script once per run; later VNRs reuse the already imported module
+    path = os.path.abspath(algo)
+    if path not in _loaded_algorithms:
+        module_name = re.sub(r'\W', '_', os.path.splitext(os.path.basename(path))[0])
+        spec = importlib.util.spec_from_file_location(module_name, path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        _loaded_algorithms[path] = module
+    return _loaded_algorithms[path]
+
+# Admission checks of algorithms run in a subprocess (isolate=True), by script name. Such a script is not
+# imported here, so its module-level admission_check cannot be looked up; scripts without an entry embed
+# every VNR unchecked.
+ADMISSION_CHECKS = {
+    'Energy_Load_Math.py': admission.check,
+}
+_unchecked = set()
+
+def load_admission_check(algo):
+    check = ADMISSION_CHECKS.get(os.path.basename(algo))
+    if check is None and algo not in _unchecked:
+        _unchecked.add(algo)
+        vne_log.info(f"No admission check registered for {algo} in ADMISSION_CHECKS, embedding without one.")
+    return check
+
+def run_embedding(algo, state, vnr, idx, isolate=False, workdir=None):
+    # In-process mode hands the live substrate state and VNR objects to the algorithm's embed() function,
+    # which applies the embedding to the state directly.
+    # Algorithms without embed(), or isolate=True, fall back to one python3 process per VNR whose result
+    # is then applied to the state here. workdir is the directory the subprocess runs in and writes
+    # its embedding details pickle to (default: the current directory).
+    # Algorithms with an admission_check(state, vnr) (see admission.py) reject hopeless VNRs first;
+    # the result is then None. An isolated algorithm is not imported here; its check is the ADMISSION_CHECKS entry.
+    module = None if isolate else load_algorithm(algo)
+    check = load_admission_check(algo) if isolate else getattr(module, 'admission_check', None)
+    if check is not None:
+        with profiling.span('admission'):
+            reason = check(state, vnr)
+        if reason:
+            vne_log.info(f"VNR{idx} rejected by admission control: {reason}")
+            vne_log.event('vnr_rejected', vnr_id=vnr['vnr_id'], reason=reason)
+            return None
+    if module is not None and hasattr(module, 'embed'):
+        return module.embed(state, vnr)  # Timed by the algorithm's own stage spans
+
+    with profiling.span('json encoding'):
+        vnr_info = {f'VNR{idx}': {f'VM{i}': {'cpu': cpu} for i, cpu in enumerate(vnr['vm_cpu_cores'], start=1)}}
+        arg = []
+        arg.append(json.dumps(vnr_info))
+        arg.append(json.dumps(state.to_topology()))
+        arg.append(str(idx))
+        arg.append(json.dumps(vnr))
+    with profiling.span('subprocess'):
+        subprocess.run(["python3", os.path.abspath(algo)] + arg, cwd=workdir)
+    with profiling.span('pickle read'):
+        with open(os.path.join(workdir or '', 'Node & Link Embedding Details.pickle'), 'rb') as f:
+            t = pickle.load(f)
 
-def load_network_data(path):
-    with open(path, 'rb') as f:
-        data = pickle.load(f)
-    return data
+    if t is None or len(t) < 4 or t[3] == False:
+        return t
 
-def calculate_total_bandwidth(topology_data):
-    return sum(link['assigned_bandwidth'] for link in topology_data['links_details'])
+    vm_to_host_mappings = extract_vm_to_host(t)
+    deduction = [(vm_to_host_mappings[f"VM{i}"], i, cpu_cores)
+                 for i, cpu_cores in enumerate(vnr['vm_cpu_cores'], start=1) if f"VM{i}" in vm_to_host_mappings]
+    with profiling.span('deduction'):
+        _, deduction_successful = deduct_allocated_cores(state, vnr['vnr_id'], deduction)
+    if deduction_successful:
+        vne_log.info(f"CPU demand deducted from Substrate Network available CPU, after successful Node mapping of VNR{idx}.")
+    else:
+        vne_log.info(f"Failed to deduct CPU demand from Substrate Network available CPU after Node mapping VNR{idx}.")
 
-def process_topology_data(topology_data):
-    link_flags = {}
-    node_flags = {}
-    for link in topology_data['links_details']:
-        node1, node2 = link['node1'], link['node2']
-        link_flags[(node1, node2)] = False
-    for node_name in topology_data:
-        if node_name.startswith('h'):
-            node_flags[node_name] = False
-    return link_flags, node_flags
+    with profiling.span('deduction'):
+        _, bandwidth_deduction_successful = deduct_allocated_bandwidth(state, extract_connections(t))
+    if bandwidth_deduction_successful:
+        vne_log.info(f"BW demand deducted from Substrate Network available BW, after successful Link mapping of VNR{idx}.")
+    else:
+        vne_log.info(f"Failed to deduct BW demand from Substrate Network available BW after Link mapping VNR{idx}.")
+    return t
+
+def load_network_data(path):
+    # Pickles, or columnar stores (see workload_store.py) which are memory-mapped instead of parsed
+    return workload_store.load(path)
 
 def print_vnr_details(vnr_data, vnr_id=None):
     for vnr in vnr_data:
         if vnr_id is not None and vnr['vnr_id'] != vnr_id:
             continue
-        print(f"VNR{vnr['vnr_id'] + 1} Details:")
-        print("VM's details:")
+        vne_log.debug(f"VNR{vnr['vnr_id'] + 1} Details:")
+        vne_log.debug("VM's details:")
         for i, cpu_cores in enumerate(vnr['vm_cpu_cores'], start=1):
-            print(f"VM{i} - CPU Demand: {cpu_cores}")
-        print("\nVirtual Links details:")
+            vne_log.debug(f"VM{i} - CPU Demand: {cpu_cores}")
+        vne_log.debug("\nVirtual Links details:")
         for i, vm_links in enumerate(vnr['vm_links'], start=1):
             if isinstance(vm_links[0], int):
                 vm_links = [(vm_links[j], vm_links[j + 1]) for j in range(0, len(vm_links), 2)]
             for link in vm_links:
                 vm1, vm2 = link
-                print(f"VM{vm1 + 1} <--> VM{vm2 + 1}, Bandwidth demand: {vnr['bandwidth_values'][i - 1]}")
+                vne_log.debug(f"VM{vm1 + 1} <--> VM{vm2 + 1}, Bandwidth demand: {vnr['bandwidth_values'][i - 1]}")
 
 def extract_vm_to_host(data):
-    print("Data received in extract_vm_to_host:", data)  # Debugging line
+    vne_log.debug("Data received in extract_vm_to_host:", data)  # Debugging line
     if isinstance(data, list):
         vm_to_host = data[0]
         return {vm: host for vm, host in vm_to_host}
@@ -78,282 +167,319 @@ def extract_connections(data):
     connections = data[1]
     return [(conn[0], conn[1], conn[2]) if len(conn) == 3 else (conn[0], conn[1], 0) for conn in connections]
 
-def deduct_allocated_cores(data, deductions):
+def revenue_and_cost(vnr, vm_to_host_mappings, connection_details):
+    # Revenue counts the demanded CPU and BW, each virtual link's BW once however many paths carry it;
+    # cost counts the demanded CPU, the CPU of every mapped VM and BW times path length
+    reve = sum(vnr['vm_cpu_cores']) + sum(vnr['bandwidth_values'])
+    cos = sum(vnr['vm_cpu_cores'])
+    cos += sum(cpu_cores for i, cpu_cores in enumerate(vnr['vm_cpu_cores'], start=1) if f"VM{i}" in vm_to_host_mappings)
+    for vms, path, bandwidth in connection_details:
+        if isinstance(path, int):  # Handle paths that are not lists
+            continue
+        cos += len(path) * bandwidth
+    return reve, cos
+
+def deduct_allocated_cores(state, vnr_id, deductions):
     try:
-        print("\nSubstrate Network CPU Available Details Before Deduction:")
-        for node_name, info in data.items():
-            if node_name.startswith('h'):
-                print(f"{node_name}: {info['allocated_cores']}")
-        for node_name, deduction_amount in deductions:
-            if node_name in data:
-                data[node_name]['allocated_cores'] -= deduction_amount
-                data[node_name]['allocated_cores'] = max(0, data[node_name]['allocated_cores'])
-        print("\nSubstrate Network CPU Available Details After Deduction:")
-        for node_name, info in data.items():
-            if node_name.startswith('h'):
-                print(f"{node_name}: {info['allocated_cores']}")
-        print("\nNode Embedding is successful.")
-        return data, True
+        if vne_log.enabled(vne_log.DEBUG):
+            vne_log.debug("\nSubstrate Network CPU Available Details Before Deduction:")
+            for node_name, info in state.servers.items():
+                vne_log.debug(f"{node_name}: {info['cpu']}")
+        for node_name, vm_index, deduction_amount in deductions:
+            if node_name in state.servers:
+                state.place_vm(node_name, vnr_id, vm_index, deduction_amount)
+        if vne_log.enabled(vne_log.DEBUG):
+            vne_log.debug("\nSubstrate Network CPU Available Details After Deduction:")
+            for node_name, info in state.servers.items():
+                vne_log.debug(f"{node_name}: {info['cpu']}")
+        vne_log.info("\nNode Embedding is successful.")
+        return state, True
     except Exception as e:
-        print(f"Error occurred during deduction: {str(e)}")
-        return data, False
+        vne_log.warning(f"Error occurred during deduction: {str(e)}")
+        return state, False
 
-def deduct_allocated_bandwidth(data, connections):
+def deduct_allocated_bandwidth(state, connections):
     try:
-        print("\nSubstrate Network Bandwidth Available Details Before Deduction:")
-        for link in data['links_details']:
-            print(f"{link['node1']} <-> {link['node2']} BW: {link['assigned_bandwidth']}")
+        if vne_log.enabled(vne_log.DEBUG):
+            vne_log.debug("\nSubstrate Network Bandwidth Available Details Before Deduction:")
+            for node1, node2 in state.links:
+                vne_log.debug(f"{node1} <-> {node2} BW: {state.edge(node1, node2)['bandwidth']}")
 
         for vms, path, bandwidth in connections:
-            for i in range(len(path) - 1):
-                u = path[i]
-                v = path[i + 1]
-                for link in data['links_details']:
-                    if (link['node1'] == u and link['node2'] == v) or (link['node1'] == v and link['node2'] == u):
-                        print(f"Before deduction: {link['node1']} <-> {link['node2']} BW: {link['assigned_bandwidth']}")
-                        link['assigned_bandwidth'] -= bandwidth
-                        link['assigned_bandwidth'] = max(0, link['assigned_bandwidth'])
-                        print(f"After deduction: {link['node1']} <-> {link['node2']} BW: {link['assigned_bandwidth']}")
-
-        print("\nSubstrate Network Bandwidth Available Details After Deduction:")
-        for link in data['links_details']:
-            print(f"{link['node1']} <-> {link['node2']} BW: {link['assigned_bandwidth']}")
-        print("\nLink Embedding is successful.")
-        return data, True
+            state.reserve_path(path, bandwidth)  # Edge index lookup per hop
+
+        if vne_log.enabled(vne_log.DEBUG):
+            vne_log.debug("\nSubstrate Network Bandwidth Available Details After Deduction:")
+            for node1, node2 in state.links:
+                vne_log.debug(f"{node1} <-> {node2} BW: {state.edge(node1, node2)['bandwidth']}")
+        vne_log.info("\nLink Embedding is successful.")
+        return state, True
     except Exception as e:
-        print(f"Error occurred during bandwidth deduction: {str(e)}")
-        return data, False
+        vne_log.warning(f"Error occurred during bandwidth deduction: {str(e)}")
+        return state, False
+
+def release_allocated_bandwidth(state, connections):
+    # Inverse of deduct_allocated_bandwidth, used when an embedded VNR leaves the substrate
+    for vms, path, bandwidth in connections:
+        state.release_path(path, bandwidth)
+    return state
 
 def append_data_to_excel(excel_file_path, data, name):
+    # Each value goes under the header of its name; columns the sheet does not have yet are added to the
+    # header, so rows with different column sets stay aligned
     if os.path.exists(excel_file_path):
         book = load_workbook(excel_file_path)
     else:
         book = Workbook()
     sheet = book.active
-    if sheet.max_row == 1:
-        headers = ["S.No", "Algorithm"] + list(data.keys())
-        sheet.append(headers)
-    row = [sheet.max_row + 1, name] + list(data.values())
-    sheet.append(row)
+    headers = [cell.value for cell in sheet[1] if cell.value is not None] or ["S.No", "Algorithm"]
+    headers += [column for column in data if column not in headers]
+    for col, header in enumerate(headers, start=1):
+        sheet.cell(row=1, column=col, value=header)
+    values = dict(data, **{"S.No": sheet.max_row + 1, "Algorithm": name})
+    sheet.append([values.get(header) for header in headers])
     book.save(excel_file_path)
 
-def algo(substrate_pickle_file_path, algo, vnr_pickle_file_path, excel_file_path, name):
-    start_time = time.time()  # Start the timer
+def append_metrics(metrics_path, rows):
+    # rows are (algorithm name, metrics row). An .xlsx path keeps the old per-row workbook append;
+    # any other path is a SQLite metrics file written in one buffered transaction.
+    if metrics_path.endswith('.xlsx'):
+        for name, data in rows:
+            append_data_to_excel(metrics_path, data, name)
+        return
+    with MetricsWriter(metrics_path) as writer:
+        for name, data in rows:
+            writer.append(name, data)
+
+def algo(substrate_pickle_file_path, algo, vnr_pickle_file_path, metrics_path, name, isolate=False, workdir=None,
+         mappings=None):
+    # Embeds every VNR of one file and returns the performance metrics row, including the time spent
+    # in each stage ("Time: <stage>" columns, see profiling.py).
+    # The row is appended to the metrics file unless metrics_path is None. The VM-to-server mapping goes
+    # to the mappings directory, by default the one next to the metrics file (metrics.mapping_dir).
+    if mappings is None and metrics_path is not None:
+        mappings = mapping_dir(metrics_path)
+    timer = profiling.StageTimer()
+    with profiling.activate(timer):
+        data = embed_vnr_file(substrate_pickle_file_path, algo, vnr_pickle_file_path, name, isolate, workdir,
+                              mappings)
+    data.update(timer.columns())
+
+    if metrics_path is not None:
+        start_time = time.perf_counter()
+        append_metrics(metrics_path, [(name, data)])
+        vne_log.info(f"\nPerformance matrix appended to {metrics_path} successfully "
+                     f"in {time.perf_counter() - start_time:.4f} seconds.")
+    return data
 
-    SN_data = load_network_data(substrate_pickle_file_path)
-    vnr_data = load_network_data(vnr_pickle_file_path)
-    print(f"\n{vnr_pickle_file_path}")
-    link_flags, node_flags = process_topology_data(SN_data)
-    vnr_count = 0
-    vm_count = 0
-    s_vnr_count = 0
-    Revenue = []
-    cost = []
-    total_vms_used_for_embedding = 0
-    total_vls_used_for_embedding = 0
-    num_vnrs = len(vnr_data)
-    total_virtual_links = 0  # Initialize total virtual links
-    total_path_length = 0  # Initialize total path length
-    total_paths = 0  # Initialize total number of paths
 
-    # Calculate initial total available CPU and BW
-    initial_total_cpu = sum(info['allocated_cores'] for node_name, info in SN_data.items() if node_name.startswith('h'))
-    initial_total_bw = calculate_total_bandwidth(SN_data)
-    print(f"Initial Total BW: {initial_total_bw}")
+def embed_vnr_file(substrate_pickle_file_path, algo, vnr_pickle_file_path, name, isolate=False, workdir=None,
+                   mappings=None):
+    start_time = time.time()  # Start the timer
+    profiler = profiling.VNRProfiler.from_env()
+
+    with profiling.span('loading'):
+        SN_data = load_network_data(substrate_pickle_file_path)
+        # Single substrate state shared with the algorithm for the whole run
+        state = SubstrateState(SN_data, path_index.for_substrate(substrate_pickle_file_path, SN_data))
+        vnr_data = load_network_data(vnr_pickle_file_path)
+    vne_log.info(f"\n{vnr_pickle_file_path}")
+    controller = controller_client.controller_url()  # Push committed paths to the SDN controller if set
+    if controller is not None and multipath.enabled():
+        raise ValueError("Split virtual links cannot be installed by the controller; "
+                         "unset the controller URL or turn off split links")
+    if controller is not None:
+        controller_client.seed_arp(controller, SN_data)
+    # Metrics are kept up to date VNR by VNR; the VM-to-server mapping goes to a sidecar CSV file in the
+    # mappings directory, if there is one. The file is named per run (start time and a random suffix), so a
+    # rerun does not overwrite the mapping an earlier metrics row points to.
+    mapping_path = None
+    if mappings is not None:
+        run = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        file_name = re.sub(r'[^\w.+-]', '_', f"{name}-{os.path.basename(vnr_pickle_file_path)}-{run}")
+        mapping_path = os.path.join(mappings, file_name + '.csv')
+    accumulator = MetricsAccumulator(state, mapping_path)
 
-    used_servers = set()  # Track used servers
-    vm_to_server_mapping = {}  # Track VM to server mapping
-    idle_servers = {node_name for node_name in SN_data if node_name.startswith('h')}  # Initialize idle servers
+    # Calculate initial total available CPU and BW
+    initial_total_cpu = state.total_cpu()
+    initial_total_bw = state.total_bandwidth()
+    vne_log.info(f"Initial Total BW: {initial_total_bw}")
 
-    print("Number of VNRs present:", num_vnrs)
+    vne_log.info("Number of VNRs present:", len(vnr_data))
     for idx, vnr in enumerate(vnr_data, start=1):
-        vm_count += len(vnr['vm_cpu_cores'])
-        total_virtual_links += len(vnr['vm_links'])  # Count virtual links
-        Revenue.append(0)
-        cost.append(0)
-        vnr_count += 1
-        backup_data = SN_data
-        print(f"\nEmbedding VNR{idx}:")
-        print_vnr_details(vnr_data, idx - 1)
-        vnr_info = {f'VNR{idx}': {f'VM{i}': {'cpu': cpu} for i, cpu in enumerate(vnr['vm_cpu_cores'], start=1)}}
-        arg = []
-        arg.append(json.dumps(vnr_info))
-        arg.append(json.dumps(SN_data))
-        arg.append(str(idx))
-        arg.append(json.dumps(vnr))
-        subprocess.run(["python3", algo] + arg)
-        with open('Node & Link Embedding Details.pickle', 'rb') as f:
-            t = pickle.load(f)
+        accumulator.offer(vnr)
+        vne_log.info(f"\nEmbedding VNR{idx}:")
+        if vne_log.enabled(vne_log.DEBUG):
+            print_vnr_details([vnr])
+        state.begin()
+        with profiler.vnr(f"{name}-{os.path.basename(vnr_pickle_file_path)}-vnr{idx}"):
+            t = run_embedding(algo, state, vnr, idx, isolate, workdir)
+        bookkeeping_start = time.perf_counter()
 
-        print("Loaded embedding details:", t)  # Debugging line
+        vne_log.debug("Loaded embedding details:", t)  # Debugging line
 
         if t is None or len(t) < 4 or t[3] == False:  # Check for embedding success
+            state.rollback()
+            vne_log.event('vnr_result', file=vnr_pickle_file_path, algorithm=name, vnr=idx, accepted=False)
+            profiling.add('bookkeeping', time.perf_counter() - bookkeeping_start)
             continue
-        else:
-            s_vnr_count += 1
-            reve = sum(vnr['vm_cpu_cores']) + sum(vnr['bandwidth_values'])
-            cos = sum(vnr['vm_cpu_cores'])
-
-            # Get VM to Host Mappings
-            vm_to_host_mappings = extract_vm_to_host(t)
-            print(f"VM to Host Mappings for VNR{idx}:", vm_to_host_mappings)  # Debug print
-            deduction = []
-            for i, cpu_cores in enumerate(vnr['vm_cpu_cores'], start=1):
-                vm_key = f"VM{i}"
-                if vm_key not in vm_to_host_mappings:
-                    print(f"Error: {vm_key} not found in vm_to_host_mappings")  # Debug print
-                    continue  # Skip this VM if not found
-                server = vm_to_host_mappings[vm_key]
-                used_servers.add(server)
-                idle_servers.discard(server)  # Remove server from idle set if it's used
-                vm_to_server_mapping[f"VNR{idx}-->{vm_key}"] = server  # Track VNR number and VM-to-server mapping
-
-                node_flags[server] = True
-                cos += cpu_cores
-                deduction.append((server, cpu_cores))
-            SN_data, deduction_successful = deduct_allocated_cores(SN_data, deduction)
-            if deduction_successful:
-                print(
-                    f"CPU demand deducted from Substrate Network available CPU, after successful Node mapping of VNR{idx}.")
-            else:
-                print(f"Failed to deduct CPU demand from Substrate Network available CPU after Node mapping VNR{idx}.")
 
-            # Get Connection Details
-            connection_details = extract_connections(t)
-            SN_data, bandwidth_deduction_successful = deduct_allocated_bandwidth(SN_data, connection_details)
-            if bandwidth_deduction_successful:
-                print(f"BW demand deducted from Substrate Network available BW, after successful Link mapping of VNR{idx}.")
-            else:
-                print(f"Failed to deduct BW demand from Substrate Network available BW after Link mapping VNR{idx}.")
-
-            for vms, path, bandwidth in connection_details:
-                if isinstance(path, int):  # Handle paths that are not lists
-                    continue
-                reve += bandwidth
-                l = len(path)
-                cos += l * bandwidth
-                total_path_length += l  # Accumulate path lengths
-                total_paths += 1  # Count the path
-
-                for j in range(len(path) - 1):
-                    node1 = path[j]
-                    node2 = path[j + 1]
-                    if (node1, node2) in link_flags:
-                        link_flags[(node1, node2)] = True
-                    if (node2, node1) in link_flags:
-                        link_flags[(node2, node1)] = True
-
-            Revenue[idx - 1] = reve
-            cost[idx - 1] = cos
-            total_vms_used_for_embedding += len(vnr['vm_cpu_cores'])
-            total_vls_used_for_embedding += len(vnr['vm_links'])
-
-    # Load the final total bandwidth from the pickle file
-    with open('Node & Link Embedding Details.pickle', 'rb') as f:
-        embedding_data = pickle.load(f)
-
-        # Ensure the embedding data has the required length before accessing the final bandwidth value
-        if len(embedding_data) >= 7:
-            initial_total_bw = embedding_data[5]
-            final_total_bw = embedding_data[6]
-        else:
-            initial_total_bw = initial_total_bw  # Default to initial value if not provided
-            final_total_bw = calculate_total_bandwidth(SN_data)  # Default to calculated final value
-
-    M_SN_data = load_network_data(substrate_pickle_file_path)
-    O_SN_host = {}
-    energy_consu = {}
-    P_idle = 150
-    P_full = 300
-    for host, info in M_SN_data.items():
-        if host.startswith('h'):
-            O_SN_host[host] = info['allocated_cores']
-    UP_SN_host = {}
-    for host, info in SN_data.items():
-        if host.startswith('h'):
-            UP_SN_host[host] = info['allocated_cores']
-            energy_consu[host] = round(
-                P_idle + (P_full - P_idle) * ((O_SN_host[host] - UP_SN_host[host]) / O_SN_host[host]), 2)
-
-    AR = round((s_vnr_count / vnr_count) * 100, 2)  # Acceptance Ratio as percentage
-    TS = len(node_flags)
-    SU = sum(1 for flag in node_flags.values() if flag is True)
-    PL = len(link_flags)
-    LU = sum(1 for flag in link_flags.values() if flag is True)
-    NS = round((total_vms_used_for_embedding / TS), 2) if TS > 0 else 0
-    ANS = round((total_vms_used_for_embedding / SU), 2) if SU > 0 else 0
-    LS = round((total_vls_used_for_embedding / PL), 2) if PL > 0 else 0
-    ALS = round((total_vls_used_for_embedding / LU), 2) if LU > 0 else 0
-    print('\n\033[1m\033[4m' + "Performance Matrices calculations" + '\033[0m')
-
-    print(f"Acceptance Ratio: {AR}% (Out of {vnr_count} VNRs {s_vnr_count} VNRs are accepted)")
-    print(f"Total Servers: {TS}, Servers Used: {SU}, Idle Servers: {TS - SU}")
-    print(f"Total Physical Links: {PL}, Links Used: {LU}, Idle Links: {PL - LU}")
-    print(f"Total Virtual Links: {total_virtual_links}")  # Print total virtual links
-    print(f"Nodes Stress: {NS}, Link Stress: {LS}")
-    print(f"Active Nodes Stress: {ANS}, Active Link Stress: {ALS}")
-
-    # Calculate total available CPU and BW after embedding
-    after_embedding_total_cpu = sum(
-        info['allocated_cores'] for node_name, info in SN_data.items() if node_name.startswith('h'))
-
-    # Calculate total energy of used SN
-    total_energy_used_sn = round(sum(energy_consu[host] for host, used in node_flags.items() if used), 2)
-
-    # Calculate average path length
-    average_path_length = round(total_path_length / total_paths, 2) if total_paths > 0 else 0
-
-    data = {
-        "VNR Pickle File Name": vnr_pickle_file_path,
-        "Number of VNRs": vnr_count,
-        "Acceptance Ratio": f"{AR}%",
-        "Total Available Servers": TS,
-        "Number of Servers Used": SU,
-        "Names of Servers Used": ", ".join(sorted(used_servers)),
-        "Number of Idle Servers": TS - SU,
-        "Names of Idle Servers": ", ".join(sorted(idle_servers)),
-        "VM-to-Server Mapping": ", ".join([f"{vm} -> {server}" for vm, server in vm_to_server_mapping.items()]),
-        "Total Available Physical Links": PL,
-        "Number of Links Used": LU,
-        "Number of Idle Links": PL - LU,
-        "Total Number of VMs": vm_count,
-        "Total VMs embedded": total_vms_used_for_embedding,    # Add total VMs used for embedding
-        "Total Number of VLs": total_virtual_links,
-        "Total VLs embedded": total_vls_used_for_embedding,  # Add total VLs used for embedding
-        "Nodes Stress": NS,
-        "Active Nodes Stress": ANS,
-        "Link Stress": LS,
-        "Active Link Stress": ALS,
-        "Before Embedding Total Available CPU of SN": initial_total_cpu,
-        "After Embedding Total Available CPU of SN": after_embedding_total_cpu,
-        "Before Embedding Total Available BW of SN": initial_total_bw,
-        "After Embedding Total Available BW of SN": final_total_bw,
-        "Average Path Length": average_path_length,
-        "Total Energy of Embedded servers only in SN": f"{total_energy_used_sn} Watts"
-    }
-
-    # Calculate Avg R/C Ratio
-    total_ratio = 0
-    for i in range(len(Revenue)):
-        if Revenue[i] != 0 and cost[i] != 0:
-            total_ratio += Revenue[i] / cost[i]
-    avg_rc_ratio = round(total_ratio / s_vnr_count, 2) if s_vnr_count > 0 else "N/A"
-    data["Avg R/C Ratio"] = avg_rc_ratio
-
-    Total_energy = round(sum(energy_consu[host] for host in energy_consu), 2)
-    data["Total Energy of SN"] = f"{Total_energy} Watts"
+        state.commit()
+        # Get VM to Host Mappings
+        vm_to_host_mappings = extract_vm_to_host(t)
+        vne_log.debug(f"VM to Host Mappings for VNR{idx}:", vm_to_host_mappings)  # Debug print
+        for i in range(1, len(vnr['vm_cpu_cores']) + 1):
+            if f"VM{i}" not in vm_to_host_mappings:
+                vne_log.warning(f"Error: VM{i} not found in vm_to_host_mappings")  # Debug print
+
+        # Get Connection Details
+        connection_details = extract_connections(t)
+        reve, cos = revenue_and_cost(vnr, vm_to_host_mappings, connection_details)
+        if controller is not None:
+            with profiling.span('controller push'):
+                request = controller_client.request_key(f"{name}:{os.path.basename(vnr_pickle_file_path)}:VNR{idx}")
+                controller_client.push_vnr_paths(controller, vnr['vnr_id'], connection_details, request)
+        accumulator.accept(f"VNR{idx}", vnr, vm_to_host_mappings, connection_details, reve, cos)
+        vne_log.event('vnr_result', file=vnr_pickle_file_path, algorithm=name, vnr=idx, accepted=True,
+                      revenue=reve, cost=cos)
+        profiling.add('bookkeeping', time.perf_counter() - bookkeeping_start)
+
+    metrics_start = time.perf_counter()
+    accumulator.close()
+    metrics = accumulator.snapshot()
+    vne_log.info('\n\033[1m\033[4m' + "Performance Matrices calculations" + '\033[0m')
+
+    vne_log.info(f"Acceptance Ratio: {metrics['Acceptance Ratio']} (Out of {accumulator.vnrs} VNRs "
+                 f"{accumulator.accepted} VNRs are accepted)")
+    vne_log.info(f"Total Servers: {metrics['Total Available Servers']}, Servers Used: {metrics['Number of Servers Used']}, "
+                 f"Idle Servers: {metrics['Number of Idle Servers']}")
+    vne_log.info(f"Total Physical Links: {metrics['Total Available Physical Links']}, "
+                 f"Links Used: {metrics['Number of Links Used']}, Idle Links: {metrics['Number of Idle Links']}")
+    vne_log.info(f"Total Virtual Links: {metrics['Total Number of VLs']}")  # Print total virtual links
+    vne_log.info(f"Nodes Stress: {metrics['Nodes Stress']}, Link Stress: {metrics['Link Stress']}")
+    vne_log.info(f"Active Nodes Stress: {metrics['Active Nodes Stress']}, "
+                 f"Active Link Stress: {metrics['Active Link Stress']}")
+
+    data = {"VNR Pickle File Name": vnr_pickle_file_path}
+    for column in ("Number of VNRs", "Acceptance Ratio", "Total Available Servers", "Number of Servers Used"):
+        data[column] = metrics[column]
+    data["Names of Servers Used"] = ", ".join(sorted(accumulator.used_servers()))
+    data["Number of Idle Servers"] = metrics["Number of Idle Servers"]
+    data["Names of Idle Servers"] = ", ".join(sorted(accumulator.idle_servers()))
+    data["VM-to-Server Mapping"] = mapping_path if mapping_path is not None and accumulator.accepted else ""
+    for column in ("Total Available Physical Links", "Number of Links Used", "Number of Idle Links",
+                   "Total Number of VMs", "Total VMs embedded", "Total Number of VLs", "Total VLs embedded",
+                   "Nodes Stress", "Active Nodes Stress", "Link Stress", "Active Link Stress"):
+        data[column] = metrics[column]
+    data["Before Embedding Total Available CPU of SN"] = initial_total_cpu
+    data["After Embedding Total Available CPU of SN"] = state.total_cpu()
+    data["Before Embedding Total Available BW of SN"] = initial_total_bw
+    data["After Embedding Total Available BW of SN"] = state.total_bandwidth()
+    for column in ("Average Path Length", "Total Energy of Embedded servers only in SN", "Avg R/C Ratio",
+                   "Total Energy of SN"):
+        data[column] = metrics[column]
 
     # Calculate total execution time
     total_execution_time = round(time.time() - start_time, 2)
     data["Total Execution Time"] = f"{total_execution_time} seconds"
+    data.update(profiler.columns())
+    profiling.add('metrics', time.perf_counter() - metrics_start)
+    return data
 
-    append_data_to_excel(excel_file_path, data, name)
-
-    print("\nPerformance matrix appended to Excel sheet successfully.")
 
+def _run_job(substrate_pickle_file_path, algo_file, vnr_file, name, isolate, mappings):
+    # One (VNR file, algorithm) job in a worker process. Each job gets its own substrate state and,
+    # for subprocess algorithms, its own working directory for the embedding details pickle.
+    workdir = tempfile.mkdtemp(prefix='vne-job-')
+    try:
+        return algo(substrate_pickle_file_path, algo_file, vnr_file, None, name, isolate, workdir, mappings)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def run_batch(substrate_pickle_file_path, jobs, metrics_path, workers=None, isolate=False, on_result=None,
+              mappings=None):
+    # Runs independent (algorithm file, VNR file, name) jobs across a process pool and appends the
+    # metrics rows to the metrics file in job order once they have all finished.
+    # on_result(job, data) is called in the parent as soon as each job finishes, e.g. to checkpoint.
+    # workers=1 runs the jobs one after another in this process. mappings as for algo().
+    if mappings is None and metrics_path is not None:
+        mappings = mapping_dir(metrics_path)
+    results = {}
+    if workers == 1:
+        for job in jobs:
+            algo_file, vnr_file, name = job
+            results[job] = algo(substrate_pickle_file_path, algo_file, vnr_file, None, name, isolate, None, mappings)
+            if on_result is not None:
+                on_result(job, results[job])
+    else:
+        if not isolate:
+            # Import the algorithms (and numpy/scipy) once here so forked workers inherit them
+            for algo_file in {job[0] for job in jobs}:
+                if os.path.exists(algo_file):
+                    load_algorithm(algo_file)
+            if os.path.exists(substrate_pickle_file_path):
+                path_index.for_substrate(substrate_pickle_file_path, load_network_data(substrate_pickle_file_path))
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {}
+            for job in jobs:
+                algo_file, vnr_file, name = job
+                futures[pool.submit(_run_job, substrate_pickle_file_path, algo_file, vnr_file, name, isolate,
+                                    mappings)] = job
+            for future in as_completed(futures):
+                job = futures[future]
+                try:
+                    results[job] = future.result()
+                except Exception as e:
+                    vne_log.warning(f"Job {job[2]} on {job[1]} failed: {e}")
+                    continue
+                if on_result is not None:
+                    on_result(job, results[job])
+
+    rows = [(job[2], results[job]) for job in jobs if job in results]
+    if metrics_path is not None:
+        append_metrics(metrics_path, rows)
+        vne_log.info(f"\n{len(rows)} performance matrices appended to {metrics_path} successfully.")
+    return rows
+
+
+# Algorithm menu number -> (script, name in the metrics sheet)
+ALGORITHMS = {
+    1: ("CEVNE.py", "CEVNE"),
+    2: ("DROI.py", "DROI"),
+    3: ("Obj1+AHP.py", "Obj1+AHP.py"),
+    4: ("SCA-R.py", "SCA-R.py"),
+    5: ("First_Fit.py", "First_Fit"),
+    6: ("Energy_Math.py", "Energy_Math"),
+}
 
 def main():
-    excel_file_path = 'OUTPUT/parameters_output.xlsx'
+    parser = argparse.ArgumentParser(description='VNE experiment manager')
+    parser.add_argument('--log-level', choices=sorted(vne_log.LEVELS), help='quiet (benchmark), info or debug')
+    parser.add_argument('--events', help='Append structured JSON-lines events to this file')
+    parser.add_argument('--workers', type=int, help='Parallel (VNR file, algorithm) jobs, default: CPU count')
+    parser.add_argument('--metrics', default='OUTPUT/parameters_output.sqlite', help='Metrics file (SQLite, or .xlsx)')
+    parser.add_argument('--excel', default='OUTPUT/parameters_output.xlsx',
+                        help='Excel export of the metrics file written on exit, empty to skip')
+    parser.add_argument('--controller', help='Ryu controller REST URL to push embedded VNR paths to, '
+                                             'e.g. http://127.0.0.1:8080')
+    parser.add_argument('--profile-dir', help='Write a cProfile dump per embedded VNR to this directory')
+    parser.add_argument('--trace-memory', action='store_true', help='Report the peak traced memory per VNR')
+    parser.add_argument('--topology', help='Substrate topology, see substrate_generator.py (default: tree of '
+                                           'SN-Input-File.txt)')
+    parser.add_argument('--mininet', action='store_true', help='Build the substrate with the Mininet emulation')
+    parser.add_argument('--split-links', action='store_true',
+                        help='Route virtual links that fit no single path over several paths (multipath.py)')
+    args = parser.parse_args()
+    vne_log.configure(args.log_level, args.events)
+    profiling.configure(args.profile_dir, args.trace_memory)
+    if args.split_links and (args.controller or controller_client.controller_url()):
+        parser.error("--split-links cannot be used with a controller: its flows carry one path per host pair")
+    multipath.configure(args.split_links)
+    if args.controller:
+        os.environ['VNE_CONTROLLER_URL'] = args.controller  # Inherited by the batch workers
+
+    metrics_path = args.metrics
 
     print("Enter your choice for SN and VM Distribution:")
     print("1. Random Distribution")
@@ -363,7 +489,8 @@ def main():
     sn_vm_gen_ch = input()
 
     args_file = 'SN-Input-File.txt'
-    execute_substrate_network(args_file, sn_vm_gen_ch)
+    execute_substrate_network(args_file, sn_vm_gen_ch, topology=args.topology,
+                              backend='mininet' if args.mininet else 'builder')
     substrate_pickle_file_path = 'SN/SN.topo.pickle'
 
     VNRs = []
@@ -386,6 +513,8 @@ def main():
         vnr_ch = int(input())
 
         if vnr_ch == 0:
+            if args.excel and not metrics_path.endswith('.xlsx') and os.path.exists(metrics_path):
+                export_excel(metrics_path, args.excel)
             break
 
         vnr_args_file = "VNE-Input-File.txt"
@@ -431,24 +560,10 @@ def main():
 
             if algo_ch == 0:
                 break
-            elif algo_ch == 1:
-                for vnr in VNRs:
-                    algo(substrate_pickle_file_path, "CEVNE.py", vnr, excel_file_path, "CEVNE")
-            elif algo_ch == 2:
-                for vnr in VNRs:
-                    algo(substrate_pickle_file_path, "DROI.py", vnr, excel_file_path, "DROI")
-            elif algo_ch == 3:
-                for vnr in VNRs:
-                    algo(substrate_pickle_file_path, "Obj1+AHP.py", vnr, excel_file_path, "Obj1+AHP.py")
-            elif algo_ch == 4:
-                for vnr in VNRs:
-                    algo(substrate_pickle_file_path, "SCA-R.py", vnr, excel_file_path, "SCA-R.py")
-            elif algo_ch == 5:
-                for vnr in VNRs:
-                    algo(substrate_pickle_file_path, "First_Fit.py", vnr, excel_file_path, "First_Fit")
-            elif algo_ch == 6:
-                for vnr in VNRs:
-                    algo(substrate_pickle_file_path, "Energy_Math.py", vnr, excel_file_path, "Energy_Math")
+            elif algo_ch in ALGORITHMS:
+                algo_file, name = ALGORITHMS[algo_ch]
+                run_batch(substrate_pickle_file_path, [(algo_file, vnr, name) for vnr in VNRs], metrics_path,
+                          args.workers)
             else:
                 print("Invalid choice, please select a valid algorithm.")
 
@@ -0,0 +1,229 @@
+import csv
+import os
+from collections import Counter
+import sqlite3
+from routing import link_key
+
+# Metrics rows (one per VNR file and algorithm) are buffered in memory and appended to a SQLite
+# table, one transaction per flush. Appending costs the same however many rows the file already
+# holds, a flush is all-or-nothing, and concurrent writers are serialised by SQLite's file lock.
+# Excel and CSV are exports made once at the end of a sweep.
+# MetricsAccumulator keeps the performance metrics of a run up to date as VNRs are accepted and depart.
+
+TABLE = 'metrics'
+MAPPING_DIR = 'mappings'  # VM-to-server mapping sidecar files, next to the metrics file
+P_IDLE, P_FULL = 150, 300  # Server power draw (W) idle and at full CPU
+
+
+def _quote(column):
+    return '"' + column.replace('"', '""') + '"'
+
+
+class MetricsWriter:
+    def __init__(self, path, table=TABLE):
+        self.path = path
+        self.table = table
+        self.rows = []
+
+    def append(self, name, data):
+        self.rows.append(dict({'Algorithm': name}, **data))
+
+    def flush(self):
+        if not self.rows:
+            return
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        connection = sqlite3.connect(self.path, timeout=60)
+        try:
+            with connection:  # One transaction: every buffered row is written, or none is
+                connection.execute(f'CREATE TABLE IF NOT EXISTS {_quote(self.table)} '
+                                   f'("S.No" INTEGER PRIMARY KEY AUTOINCREMENT, "Algorithm")')
+                columns = [row[1] for row in connection.execute(f'PRAGMA table_info({_quote(self.table)})')]
+                for row in self.rows:
+                    for column in row:
+                        if column not in columns:
+                            connection.execute(f'ALTER TABLE {_quote(self.table)} ADD COLUMN {_quote(column)}')
+                            columns.append(column)
+                for row in self.rows:
+                    names = list(row)
+                    connection.execute(f'INSERT INTO {_quote(self.table)} ({", ".join(map(_quote, names))}) '
+                                       f'VALUES ({", ".join("?" * len(names))})', [row[name] for name in names])
+        finally:
+            connection.close()
+        self.rows = []
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def mapping_dir(metrics_path):
+    return os.path.join(os.path.dirname(os.path.abspath(metrics_path)), MAPPING_DIR)
+
+
+def read_rows(path, table=TABLE):
+    connection = sqlite3.connect(path, timeout=60)
+    try:
+        cursor = connection.execute(f'SELECT * FROM {_quote(table)} ORDER BY "S.No"')
+        return [column[0] for column in cursor.description], cursor.fetchall()
+    finally:
+        connection.close()
+
+
+def export_csv(path, csv_path, table=TABLE):
+    headers, rows = read_rows(path, table)
+    with open(csv_path + '.tmp', 'w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(headers)
+        writer.writerows(rows)
+    os.replace(csv_path + '.tmp', csv_path)
+
+
+def export_excel(path, excel_path, table=TABLE):
+    from openpyxl import Workbook  # Only needed for the export
+
+    headers, rows = read_rows(path, table)
+    book = Workbook(write_only=True)
+    sheet = book.create_sheet()
+    sheet.append(headers)
+    for row in rows:
+        sheet.append(row)
+    book.save(excel_path + '.tmp.xlsx')
+    os.replace(excel_path + '.tmp.xlsx', excel_path)
+
+
+class MetricsAccumulator:
+    # Performance metrics of a run, updated as each VNR is offered, accepted or departs, so a snapshot
+    # costs the same at any point of the run. Counts of offered and accepted VNRs, VMs and virtual links,
+    # revenue/cost and path lengths are cumulative; servers and links in use and the energy drawn
+    # follow what is embedded now. A server or link is in use while an embedded path or VM uses it.
+    # Energy of a server: P_IDLE + (P_FULL - P_IDLE) * used CPU / original CPU, rounded to 2 decimals.
+    # The VM-to-server mapping of every accepted VNR is appended to a CSV sidecar file (mapping_path)
+    # instead of being held in memory.
+
+    def __init__(self, state, mapping_path=None):
+        self.state = state
+        self.server_refs = [0] * len(state.server_ids)
+        self.servers_used = 0
+        self.energy = [round(self._energy(pos), 2) for pos in range(len(state.server_ids))]
+        self.total_energy = sum(self.energy)
+        self.used_energy = 0.0
+        # Physical links as listed in the topology; a (node1, node2) and (node2, node1) listing count apart
+        self.link_entries = {}
+        for node1, node2 in dict.fromkeys(state.links):
+            self.link_entries[link_key(node1, node2)] = self.link_entries.get(link_key(node1, node2), 0) + 1
+        self.physical_links = sum(self.link_entries.values())
+        self.link_refs = {}
+        self.links_used = 0
+
+        self.vnrs = self.accepted = 0
+        self.vms = self.vms_embedded = 0
+        self.vls = self.vls_embedded = 0
+        self.path_length = self.paths = 0
+        self.rc_sum = 0.0
+        self.mapping_path = mapping_path
+        self._mapping_file = None
+
+    def _energy(self, pos):
+        original = self.state.original_cpu[pos]
+        return P_IDLE + (P_FULL - P_IDLE) * ((original - self.state.cpu[pos]) / original)
+
+    def offer(self, vnr):
+        self.vnrs += 1
+        self.vms += len(vnr['vm_cpu_cores'])
+        self.vls += len(vnr['vm_links'])
+
+    def accept(self, label, vnr, vm_to_host, connections, revenue, cost):
+        # Call after the VNR's resources are committed to the state. Returns the record depart() needs.
+        self.accepted += 1
+        self.vms_embedded += len(vnr['vm_cpu_cores'])
+        self.vls_embedded += len(vnr['vm_links'])
+        if revenue != 0 and cost != 0:
+            self.rc_sum += revenue / cost
+        servers = list(vm_to_host.values())
+        links = []
+        for vms, path, bandwidth in connections:
+            if isinstance(path, int):  # Handle paths that are not lists
+                continue
+            self.path_length += len(path)
+            self.paths += 1
+            links.extend(link_key(path[j], path[j + 1]) for j in range(len(path) - 1))
+        self._use(servers, links, 1)
+        if self.mapping_path is not None:
+            self._write_mapping(label, vm_to_host)
+        return servers, links
+
+    def depart(self, record):
+        # Call after the VNR's resources are released from the state
+        servers, links = record
+        self._use(servers, links, -1)
+
+    def _use(self, servers, links, delta):
+        server_pos = self.state.server_pos
+        for server, vms in Counter(servers).items():
+            pos = server_pos[server]
+            was_used = self.server_refs[pos] > 0
+            self.server_refs[pos] += delta * vms
+            used = self.server_refs[pos] > 0
+            energy = round(self._energy(pos), 2)
+            self.total_energy += energy - self.energy[pos]
+            self.used_energy += (energy if used else 0) - (self.energy[pos] if was_used else 0)
+            self.servers_used += used - was_used
+            self.energy[pos] = energy
+        for key in links:
+            if key not in self.link_entries:
+                continue
+            refs = self.link_refs.get(key, 0)
+            if refs == 0 and delta > 0:
+                self.links_used += self.link_entries[key]
+            elif refs + delta == 0:
+                self.links_used -= self.link_entries[key]
+            self.link_refs[key] = refs + delta
+
+    def _write_mapping(self, label, vm_to_host):
+        if self._mapping_file is None:
+            os.makedirs(os.path.dirname(self.mapping_path) or '.', exist_ok=True)
+            self._mapping_file = open(self.mapping_path, 'w', newline='')
+            self._mapping_writer = csv.writer(self._mapping_file)
+            self._mapping_writer.writerow(['VNR', 'VM', 'Server'])
+        self._mapping_writer.writerows((label, vm, server) for vm, server in vm_to_host.items())
+
+    def close(self):
+        if self._mapping_file is not None:
+            self._mapping_file.close()
+            self._mapping_file = None
+
+    def used_servers(self):
+        return [server for server, refs in zip(self.state.server_ids, self.server_refs) if refs > 0]
+
+    def idle_servers(self):
+        return [server for server, refs in zip(self.state.server_ids, self.server_refs) if refs == 0]
+
+    def snapshot(self):
+        servers = len(self.server_refs)
+        return {
+            "Number of VNRs": self.vnrs,
+            "Acceptance Ratio": f"{round(self.accepted / self.vnrs * 100, 2) if self.vnrs else 0.0}%",
+            "Total Available Servers": servers,
+            "Number of Servers Used": self.servers_used,
+            "Number of Idle Servers": servers - self.servers_used,
+            "Total Available Physical Links": self.physical_links,
+            "Number of Links Used": self.links_used,
+            "Number of Idle Links": self.physical_links - self.links_used,
+            "Total Number of VMs": self.vms,
+            "Total VMs embedded": self.vms_embedded,
+            "Total Number of VLs": self.vls,
+            "Total VLs embedded": self.vls_embedded,
+            "Nodes Stress": round(self.vms_embedded / servers, 2) if servers else 0,
+            "Active Nodes Stress": round(self.vms_embedded / self.servers_used, 2) if self.servers_used else 0,
+            "Link Stress": round(self.vls_embedded / self.physical_links, 2) if self.physical_links else 0,
+            "Active Link Stress": round(self.vls_embedded / self.links_used, 2) if self.links_used else 0,
+            "Average Path Length": round(self.path_length / self.paths, 2) if self.paths else 0,
+            "Total Energy of Embedded servers only in SN": f"{round(self.used_energy, 2)} Watts",
+            "Avg R/C Ratio": round(self.rc_sum / self.accepted, 2) if self.accepted else "N/A",
+            "Total Energy of SN": f"{round(self.total_energy, 2)} Watts",
+        }
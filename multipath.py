@@ -0,0 +1,117 @@
+import os
+import numpy as np
+from scipy.optimize import linprog
+from scipy.sparse import csr_matrix
+from routing import link_key
+
+# Splittable link embedding. The virtual links of a VNR are routed together as a multi-commodity flow
+# restricted to a column set of up to K_PATHS shortest candidate paths per virtual link (the state's
+# PathCache, so a path_index is used when there is one). The LP has one variable per (virtual link,
+# path), the bandwidth carried on it:
+#   minimise   sum of bandwidth * hops            (substrate bandwidth consumed)
+#   subject to the shares of a virtual link add up to its demand
+#              the shares over a substrate link fit its residual bandwidth
+# Bandwidths are whole units, so the LP shares are rounded to integers adding up to each demand (largest
+# remainder); if the rounded shares overflow a link, the LP is solved again with integer shares.
+# Each share is then an ordinary (vms, path, bandwidth) connection, so deduct_allocated_bandwidth,
+# revenue/cost and the metrics handle split links as several paths.
+# Switched on with configure(True) (manager.py / simulator.py --split-links); like the log level it is
+# passed to worker processes through the environment.
+
+K_PATHS = 4
+
+
+def configure(split_links=False):
+    if split_links:
+        os.environ['VNE_SPLIT_LINKS'] = '1'
+
+
+def enabled():
+    return os.environ.get('VNE_SPLIT_LINKS') == '1'
+
+
+def _round_shares(columns, x, demands):
+    # Largest remainder per demand: floor every share, then add one unit to the shares with the largest
+    # fractional parts until the demand is met
+    shares = np.floor(np.maximum(x, 0) + 1e-9).astype(np.int64)
+    by_demand = {}
+    for col, (i, _) in enumerate(columns):
+        by_demand.setdefault(i, []).append(col)
+    for i, cols in by_demand.items():
+        missing = int(demands[i][2]) - int(shares[cols].sum())
+        if missing < 0:
+            return None
+        for col in sorted(cols, key=lambda col: shares[col] - x[col])[:missing]:
+            shares[col] += 1
+    return shares
+
+
+def split_flows(state, demands, k=K_PATHS):
+    # demands: (source server, target server, bandwidth) per virtual link, in whole units. Returns, per
+    # demand, the [(path, share), ...] carrying it with integer shares, or None if the candidate paths
+    # cannot carry every demand. A demand of no bandwidth gets its shortest path with a share of 0.
+    flows = [None] * len(demands)
+    # Whatever the paths, a server's links must carry the demands of its virtual links
+    load = {}
+    for src, dst, bandwidth in demands:
+        if src != dst:
+            load[src] = load.get(src, 0) + bandwidth
+            load[dst] = load.get(dst, 0) + bandwidth
+    for server, bandwidth in load.items():
+        if state.uplink[state.server_pos[server]] < bandwidth:
+            return None
+
+    columns = []  # (demand index, path)
+    for i, (src, dst, bandwidth) in enumerate(demands):
+        if src == dst:
+            flows[i] = [([src], bandwidth)]  # Both VMs on one server, nothing to route
+            continue
+        if bandwidth <= 0:
+            path = state.routes.path(src, dst, 0)  # Not an LP column: it would get no share
+            if path is None:
+                return None
+            flows[i] = [(path, 0)]
+            continue
+        paths = state.routes.paths(src, dst, 1, k)  # Paths with at least one unit of residual bandwidth
+        # Even alone, a virtual link gets no more than the sum of its paths' bottlenecks
+        if sum(min(state.edges[link_key(u, v)]['bandwidth'] for u, v in zip(path, path[1:]))
+               for path in paths) < bandwidth:
+            return None
+        columns.extend((i, path) for path in paths)
+    if not columns:
+        return flows
+
+    rows = {}  # Substrate link -> capacity row
+    link_rows, link_cols = [], []
+    for col, (_, path) in enumerate(columns):
+        for u, v in zip(path, path[1:]):
+            link_rows.append(rows.setdefault(link_key(u, v), len(rows)))
+            link_cols.append(col)
+    capacity = np.array([state.edges[key]['bandwidth'] for key in rows], dtype=float)
+    routed = sorted({i for i, _ in columns})
+    demand_row = {i: row for row, i in enumerate(routed)}
+
+    problem = dict(
+        c=np.array([len(path) - 1 for _, path in columns], dtype=float),
+        A_ub=csr_matrix((np.ones(len(link_rows)), (link_rows, link_cols)), shape=(len(rows), len(columns))),
+        b_ub=capacity,
+        A_eq=csr_matrix((np.ones(len(columns)), ([demand_row[i] for i, _ in columns], range(len(columns)))),
+                        shape=(len(routed), len(columns))),
+        b_eq=np.array([demands[i][2] for i in routed], dtype=float),
+        bounds=(0, None), method='highs')
+    result = linprog(**problem)
+    if result.status != 0:
+        return None
+    shares = _round_shares(columns, result.x, demands)
+    if shares is None or np.any(problem['A_ub'] @ shares > capacity):
+        result = linprog(integrality=np.ones(len(columns)), **problem)
+        if result.status != 0:
+            return None
+        shares = _round_shares(columns, result.x, demands)
+        if shares is None or np.any(problem['A_ub'] @ shares > capacity):
+            return None
+
+    for (i, path), share in zip(columns, shares.tolist()):
+        if share > 0:
+            flows[i] = (flows[i] or []) + [(path, share)]
+    return flows
@@ -0,0 +1,108 @@
+import os
+import zlib
+from array import array
+from collections import OrderedDict, deque
+from routing import k_shortest_paths, link_key
+
+# Static routing index of a substrate: hop distances and the k shortest candidate paths between nodes,
+# on the full topology. The shape of the substrate does not change during a run, only residual
+# bandwidths do, so PathCache can answer most routing queries by filtering these candidates instead of
+# searching the graph. Nothing is computed up front: the first query about a node runs a breadth-first
+# search from it, and the candidate paths of a pair are found (Yen, guided by those distances) when the
+# pair is first asked for, only as many as the query needs. Per node the index keeps its distance row
+# and the candidate paths found from it; at most `sources` nodes are kept, least recently used dropped
+# first, so memory stays at O(sources * nodes) however large the substrate and work is only spent on
+# pairs that are routed.
+
+DEFAULT_K = 4
+DEFAULT_SOURCES = 128
+
+_indexes = {}  # Substrate path -> PathIndex, so every run on a substrate in a process reuses its entries
+
+
+def fingerprint(sn_topology):
+    # Depends on the hosts and the links, not on capacities, so residual snapshots match their substrate
+    links = sorted(link_key(link['node1'], link['node2']) for link in sn_topology['links_details'])
+    return zlib.crc32(repr((sn_topology['num_hosts'], links)).encode())
+
+
+class PathIndex:
+    def __init__(self, graph, k=DEFAULT_K, fingerprint=None, sources=DEFAULT_SOURCES):
+        self.graph = graph  # node -> {neighbor: {'bandwidth': 0}}, the shape of the substrate only
+        self.node_pos = {node: pos for pos, node in enumerate(sorted(graph))}
+        self.k = k
+        self.fingerprint = fingerprint
+        self.sources = sources
+        self._entries = OrderedDict()  # node -> [distance row or None, {other node: (count, paths)}]
+
+    def __contains__(self, node):
+        return node in self.node_pos
+
+    def _entry(self, node):
+        entry = self._entries.get(node)
+        if entry is None:
+            entry = self._entries[node] = [None, {}]
+            if len(self._entries) > self.sources:
+                self._entries.popitem(last=False)
+        else:
+            self._entries.move_to_end(node)
+        return entry
+
+    def _distances(self, source):
+        entry = self._entry(source)
+        if entry[0] is None:
+            node_pos, graph = self.node_pos, self.graph
+            row = array('f', [float('inf')]) * len(node_pos)
+            row[node_pos[source]] = 0
+            queue = deque([source])
+            while queue:
+                node = queue.popleft()
+                hops = row[node_pos[node]] + 1
+                for neighbor in graph[node]:
+                    if row[node_pos[neighbor]] == float('inf'):
+                        row[node_pos[neighbor]] = hops
+                        queue.append(neighbor)
+            entry[0] = row
+        return entry[0]
+
+    def distance(self, u, v):
+        # Hop count on the full topology; a lower bound on any bandwidth-feasible path, inf if unreachable.
+        # Links are undirected, so this is v's row: A* calls it for many u towards one v.
+        return self._distances(v)[self.node_pos[u]]
+
+    def candidates(self, src, dst, count=None):
+        # Up to count (at most k, default k) shortest paths from src to dst on the full topology, shortest
+        # first; None if not indexed. Fewer than count means they are all the paths there are.
+        if src not in self.node_pos or dst not in self.node_pos:
+            return None
+        if src == dst:
+            return [[src]]
+        count = self.k if count is None else min(count, self.k)
+        first, second = (src, dst) if src < dst else (dst, src)
+        found = self._entry(first)[1].get(second)
+        if found is None or len(found[1]) == found[0] < count:  # Not found yet, or more may be found
+            row, node_pos = self._distances(second), self.node_pos
+            paths = k_shortest_paths(self.graph, first, second, 0, count, heuristic=lambda node: row[node_pos[node]])
+            found = self._entry(first)[1][second] = (count, [tuple(path) for path in paths])
+        paths = found[1][:count]
+        if src < dst:
+            return [list(path) for path in paths]
+        return [list(reversed(path)) for path in paths]
+
+
+def build(sn_topology, k=DEFAULT_K, sources=DEFAULT_SOURCES):
+    graph = {}
+    for link in sn_topology['links_details']:
+        node1, node2 = link['node1'], link['node2']
+        graph.setdefault(node1, {})[node2] = {'bandwidth': 0}
+        graph.setdefault(node2, {})[node1] = {'bandwidth': 0}
+    return PathIndex(graph, k, fingerprint(sn_topology), sources)
+
+
+def for_substrate(substrate_path, sn_topology, k=DEFAULT_K):
+    # The index of a substrate file, reused while the topology keeps its shape
+    key = (os.path.abspath(substrate_path), k)
+    index = _indexes.get(key)
+    if index is None or index.fingerprint != fingerprint(sn_topology):
+        index = _indexes[key] = build(sn_topology, k)
+    return index
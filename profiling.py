@@ -0,0 +1,121 @@
+import cProfile
+import os
+import re
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+# Stage timing for manager.algo and the algorithms it runs. A StageTimer is made active for the duration
+# of a run; span(name) anywhere below it adds the elapsed time to that stage's total, and is a no-op when
+# no timer is active. The totals become "Time: <stage>" metric columns, one per STAGES entry whether or
+# not it ran, so in-process and isolated runs give rows with the same columns.
+# Per-VNR cProfile dumps and tracemalloc peaks are switched on with configure() (manager.py
+# --profile-dir / --trace-memory); like the log level they are passed to worker processes through the
+# environment.
+
+STAGES = ('loading', 'admission', 'node mapping', 'link mapping', 'json encoding', 'subprocess', 'pickle read',
+          'deduction', 'bookkeeping', 'controller push', 'metrics')
+
+_current = None
+
+
+class StageTimer:
+    def __init__(self):
+        self.totals = {}
+
+    def add(self, name, seconds):
+        self.totals[name] = self.totals.get(name, 0.0) + seconds
+
+    @contextmanager
+    def span(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def columns(self):
+        # STAGES in order, 0.0 for those that did not run, then any other stage that did
+        names = list(STAGES) + sorted(set(self.totals) - set(STAGES))
+        return {f"Time: {name}": round(self.totals.get(name, 0.0), 4) for name in names}
+
+
+@contextmanager
+def activate(timer):
+    global _current
+    previous, _current = _current, timer
+    try:
+        yield timer
+    finally:
+        _current = previous
+
+
+def add(name, seconds):
+    if _current is not None:
+        _current.add(name, seconds)
+
+
+@contextmanager
+def span(name):
+    timer = _current
+    if timer is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timer.add(name, time.perf_counter() - start)
+
+
+def configure(profile_dir=None, trace_memory=False):
+    if profile_dir:
+        os.environ['VNE_PROFILE_DIR'] = os.path.abspath(profile_dir)
+    if trace_memory:
+        os.environ['VNE_TRACE_MEMORY'] = '1'
+
+
+class VNRProfiler:
+    # Optional per-VNR capture: a cProfile dump <profile_dir>/<label>.prof for each VNR and/or the peak
+    # traced memory, of which the largest over the run is reported
+    def __init__(self, profile_dir=None, trace_memory=False):
+        self.profile_dir = profile_dir
+        self.trace_memory = trace_memory
+        self.peak_memory = 0
+        if profile_dir:
+            os.makedirs(profile_dir, exist_ok=True)
+
+    @classmethod
+    def from_env(cls):
+        return cls(os.environ.get('VNE_PROFILE_DIR') or None, os.environ.get('VNE_TRACE_MEMORY') == '1')
+
+    @property
+    def enabled(self):
+        return self.profile_dir is not None or self.trace_memory
+
+    @contextmanager
+    def vnr(self, label):
+        if not self.enabled:
+            yield
+            return
+        profile = cProfile.Profile() if self.profile_dir else None
+        started_tracing = self.trace_memory and not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        elif self.trace_memory:
+            tracemalloc.reset_peak()
+        if profile is not None:
+            profile.enable()
+        try:
+            yield
+        finally:
+            if profile is not None:
+                profile.disable()
+                profile.dump_stats(os.path.join(self.profile_dir, re.sub(r'[^\w.-]', '_', label) + '.prof'))
+            if self.trace_memory:
+                self.peak_memory = max(self.peak_memory, tracemalloc.get_traced_memory()[1])
+                if started_tracing:
+                    tracemalloc.stop()
+
+    def columns(self):
+        return {"Peak Memory per VNR (KiB)": round(self.peak_memory / 1024, 1)} if self.trace_memory else {}
@@ -1,34 +1,43 @@
 import random
 import math
+import numpy as np
+
+# Truncated Poisson sampling by inverse transform. A draw is lower_bound + j with j ~ Poisson(mean),
+# restricted to [lower_bound, upper_bound]. This is the distribution the old rejection sampler aimed at,
+# before it seeded its running product with upper_bound instead of 1. The CDF table is computed once per
+# (lower_bound, upper_bound, mean), so each draw is one uniform number plus a binary search.
+
+_cdf_tables = {}
+
+
+def truncated_poisson_cdf(lower_bound, upper_bound, mean):
+    key = (lower_bound, upper_bound, mean)
+    if key not in _cdf_tables:
+        if upper_bound < lower_bound:
+            raise ValueError(f"Invalid Poisson range: upper bound {upper_bound} is below lower bound {lower_bound}")
+        j = np.arange(upper_bound - lower_bound + 1)
+        if mean > 0:
+            log_pmf = j * math.log(mean) - np.array([math.lgamma(n + 1) for n in j])
+            pmf = np.exp(log_pmf - log_pmf.max())  # In log space, so large means do not overflow
+        else:
+            pmf = (j == 0).astype(float)
+        cdf = np.cumsum(pmf)
+        _cdf_tables[key] = cdf / cdf[-1]
+    return _cdf_tables[key]
+
+
+def truncated_poisson(lower_bound, upper_bound, mean, size=None, rng=None):
+    # size=None returns one int, otherwise an int64 array; rng is a numpy Generator (default: a fresh one)
+    cdf = truncated_poisson_cdf(lower_bound, upper_bound, mean)
+    rng = np.random.default_rng() if rng is None else rng
+    if size is None:
+        return lower_bound + int(np.searchsorted(cdf, rng.random(), side='right'))
+    return lower_bound + np.searchsorted(cdf, rng.random(size), side='right')
+
+
 def randomPoissonNumber(lower_bound, upper_bound, mean):
-    for _ in range(1000):
-        r = random.random()
-        l = math.exp(-mean)
-        k = lower_bound
-        p = upper_bound
-        while True:
-            p = p*r
-            k += 1
-            if p<=l:
-                break
-        if (k-1)<=upper_bound and (k-1)>=lower_bound:
-            return k-1
+    cdf = truncated_poisson_cdf(lower_bound, upper_bound, mean)
+    return lower_bound + int(np.searchsorted(cdf, random.random(), side='right'))
 
 def randomPoissonNumber_rand(lower_bound, upper_bound, mean):
-    ls = []
-    cnt = 50
-    for _ in range(1000):
-        r = random.random()
-        l = math.exp(-mean)
-        k = lower_bound
-        p = upper_bound
-        while True:
-            p = p*r
-            k += 1
-            if p<=l:
-                break
-        if (k-1)<=upper_bound and (k-1)>=lower_bound:
-            ls.append(k-1)
-        if len(ls) == cnt:
-            break
-    return random.choice(ls)
\ No newline at end of file
+    return randomPoissonNumber(lower_bound, upper_bound, mean)
@@ -0,0 +1,165 @@
+import heapq
+import math
+
+
+def link_key(u, v):
+    # Unordered node pair identifying an undirected substrate link
+    return (u, v) if u <= v else (v, u)
+
+
+def hop_cost(u, v, edge):
+    return 1
+
+
+def path_cost(graph, path, cost=hop_cost):
+    return sum(cost(u, v, graph[u][v]) for u, v in zip(path, path[1:]))
+
+
+def shortest_path(graph, src, dst, demand=0, cost=hop_cost, heuristic=None, banned_nodes=(), banned_edges=()):
+    # Dijkstra (A* when a heuristic is given) over links whose residual bandwidth covers the demand.
+    # Only distances and predecessors are kept per node; the path is rebuilt once dst is settled.
+    if src == dst:
+        return [src]
+    dist = {src: 0}
+    pred = {src: None}
+    settled = set()
+    heap = [(heuristic(src) if heuristic else 0, src)]
+    while heap:
+        _, node = heapq.heappop(heap)
+        if node in settled:
+            continue
+        if node == dst:
+            path = [dst]
+            while pred[path[-1]] is not None:
+                path.append(pred[path[-1]])
+            path.reverse()
+            return path
+        settled.add(node)
+        for neighbor, edge in graph[node].items():
+            if neighbor in settled or neighbor in banned_nodes or edge['bandwidth'] < demand:
+                continue
+            if (node, neighbor) in banned_edges:
+                continue
+            new_dist = dist[node] + cost(node, neighbor, edge)
+            if new_dist < dist.get(neighbor, math.inf):
+                dist[neighbor] = new_dist
+                pred[neighbor] = node
+                heapq.heappush(heap, (new_dist + (heuristic(neighbor) if heuristic else 0), neighbor))
+    return None
+
+
+def k_shortest_paths(graph, src, dst, demand=0, k=1, cost=hop_cost, heuristic=None):
+    # Yen's algorithm: up to k loopless bandwidth-feasible paths in increasing cost order
+    first = shortest_path(graph, src, dst, demand, cost, heuristic)
+    if first is None:
+        return []
+    paths = [first]
+    seen = {tuple(first)}
+    candidates = []
+    while len(paths) < k:
+        previous = paths[-1]
+        for i in range(len(previous) - 1):
+            spur_node = previous[i]
+            root = previous[:i + 1]
+            banned_edges = {(p[i], p[i + 1]) for p in paths if p[:i + 1] == root}
+            spur = shortest_path(graph, spur_node, dst, demand, cost, heuristic,
+                                 banned_nodes=set(root[:-1]), banned_edges=banned_edges)
+            if spur is None:
+                continue
+            candidate = root[:-1] + spur
+            if tuple(candidate) not in seen:
+                seen.add(tuple(candidate))
+                heapq.heappush(candidates, (path_cost(graph, candidate, cost), candidate))
+        if not candidates:
+            break
+        paths.append(heapq.heappop(candidates)[1])
+    return paths
+
+
+class PathCache:
+    # Caches k-shortest feasible paths per (src, dst, demand bucket, k). Demands are rounded up to the
+    # bucket threshold, so a cached path is feasible for every demand in its bucket. When a link's
+    # residual bandwidth crosses a threshold, only the entries that can have changed are dropped:
+    # a decrease invalidates entries routed over that link, an increase invalidates every entry of
+    # that threshold since a shorter path may have opened up.
+    # With a path_index.PathIndex (hop cost only), a miss first filters the index's candidate paths
+    # by residual bandwidth and only searches the graph, guided by the index's hop distances, when the
+    # candidates cannot prove the answer.
+
+    def __init__(self, graph, bucket_size=1, cost=hop_cost, index=None):
+        self.graph = graph
+        self.bucket_size = bucket_size
+        self.cost = cost
+        self.index = index if cost is hop_cost else None
+        self._entries = {}  # key -> (paths, links used by the paths)
+        self._by_threshold = {}
+        self._by_link = {}
+
+    def threshold(self, demand):
+        return math.ceil(demand / self.bucket_size) * self.bucket_size
+
+    def paths(self, src, dst, demand, k=1):
+        key = (src, dst, self.threshold(demand), k)
+        entry = self._entries.get(key)
+        if entry is None:
+            paths = self._indexed_paths(src, dst, key[2], k)
+            if paths is None:
+                heuristic = None
+                if self.index is not None and dst in self.index:
+                    heuristic = lambda node: self.index.distance(node, dst)
+                paths = k_shortest_paths(self.graph, src, dst, key[2], k, self.cost, heuristic)
+            links = {link_key(u, v) for path in paths for u, v in zip(path, path[1:])}
+            entry = self._entries[key] = (paths, links)
+            self._by_threshold.setdefault(key[2], set()).add(key)
+            for link in links:
+                self._by_link.setdefault(link, set()).add(key)
+        return entry[0]
+
+    def _indexed_paths(self, src, dst, demand, k):
+        # The candidates are the shortest paths overall, so the first k feasible ones are the k shortest
+        # feasible paths. The k shortest are tried first, then index.k; fewer candidates than asked for
+        # means they are all the paths there are.
+        if self.index is None or k > self.index.k:
+            return None
+        graph = self.graph
+        for count in sorted({k, self.index.k}):
+            candidates = self.index.candidates(src, dst, count)
+            if candidates is None:
+                return None
+            feasible = []
+            for path in candidates:
+                if all(graph[u][v]['bandwidth'] >= demand for u, v in zip(path, path[1:])):
+                    feasible.append(path)
+                    if len(feasible) == k:
+                        return feasible
+            if len(candidates) < count:
+                return feasible
+        return None
+
+    def path(self, src, dst, demand):
+        paths = self.paths(src, dst, demand)
+        return paths[0] if paths else None
+
+    def link_changed(self, u, v, old_bandwidth, new_bandwidth):
+        low, high = min(old_bandwidth, new_bandwidth), max(old_bandwidth, new_bandwidth)
+        crossed = [t for t in self._by_threshold if low < t <= high]
+        if not crossed:
+            return
+        if new_bandwidth < old_bandwidth:
+            on_link = self._by_link.get(link_key(u, v), ())
+            stale = [key for t in crossed for key in self._by_threshold[t] if key in on_link]
+        else:
+            stale = [key for t in crossed for key in self._by_threshold[t]]
+        for key in stale:
+            self._invalidate(key)
+
+    def clear(self):
+        self._entries.clear()
+        self._by_threshold.clear()
+        self._by_link.clear()
+
+    def _invalidate(self, key):
+        _, links = self._entries.pop(key)
+        self._by_threshold[key[2]].discard(key)
+        for link in links:
+            self._by_link[link].discard(key)
@@ -0,0 +1,147 @@
+import argparse
+import heapq
+import itertools
+import random
+import time
+import manager
+import multipath
+import path_index
+import vne_log
+from metrics import MetricsWriter, MetricsAccumulator
+from substrate import SubstrateState
+
+# Online (streaming) VNE simulation. VNRs arrive as a Poisson process, stay for an exponentially
+# distributed lifetime and release their CPU and bandwidth when they leave. The event loop is a
+# priority queue of (time, sequence, kind, payload); acceptance ratio and revenue/cost are reported
+# per time window so the steady state can be told apart from the warm-up.
+
+ARRIVAL, DEPARTURE = 0, 1
+
+
+class Window:
+    def __init__(self, start):
+        self.start = start
+        self.arrivals = 0
+        self.accepted = 0
+        self.departures = 0
+        self.revenue = 0
+        self.cost = 0
+
+    def row(self, length, state, active, accumulator):
+        snapshot = accumulator.snapshot()
+        return {
+            "Window Start": round(self.start, 3),
+            "Window End": round(self.start + length, 3),
+            "Arrivals": self.arrivals,
+            "Accepted": self.accepted,
+            "Departures": self.departures,
+            "Acceptance Ratio": round(self.accepted / self.arrivals * 100, 2) if self.arrivals else None,
+            "Revenue": self.revenue,
+            "Cost": self.cost,
+            "R/C Ratio": round(self.revenue / self.cost, 4) if self.cost else None,
+            "Active VNRs": active,
+            "Available CPU of SN": state.total_cpu(),
+            "Available BW of SN": state.total_bandwidth(),
+            "Servers Used": snapshot["Number of Servers Used"],
+            "Links Used": snapshot["Number of Links Used"],
+            "Energy of SN": snapshot["Total Energy of SN"],
+        }
+
+
+def simulate(substrate_pickle_file_path, algo_file, vnr_templates, arrival_rate, mean_lifetime, num_arrivals,
+             window_length, seed=None, isolate=False):
+    # vnr_templates are cycled through; every arrival gets a copy with its own vnr_id.
+    # Returns one metrics row per time window.
+    rng = random.Random(seed)
+    sn_topology = manager.load_network_data(substrate_pickle_file_path)
+    state = SubstrateState(sn_topology, path_index.for_substrate(substrate_pickle_file_path, sn_topology))
+    templates = itertools.cycle(vnr_templates)
+    sequence = itertools.count()
+    events = [(rng.expovariate(arrival_rate), next(sequence), ARRIVAL, None)]
+    allocations = {}  # vnr_id -> (allocation record from SubstrateState.commit(), accumulator record)
+    accumulator = MetricsAccumulator(state)
+    window = Window(0.0)
+    rows = []
+    arrivals = 0
+
+    while events:
+        now, _, kind, payload = heapq.heappop(events)
+        while now >= window.start + window_length:
+            rows.append(window.row(window_length, state, len(allocations), accumulator))
+            window = Window(window.start + window_length)
+
+        if kind == DEPARTURE:
+            allocation, record = allocations.pop(payload)
+            state.release(allocation)
+            accumulator.depart(record)
+            window.departures += 1
+            continue
+
+        vnr = dict(next(templates), vnr_id=arrivals)
+        arrivals += 1
+        window.arrivals += 1
+        if arrivals < num_arrivals:
+            heapq.heappush(events, (now + rng.expovariate(arrival_rate), next(sequence), ARRIVAL, None))
+
+        accumulator.offer(vnr)
+        state.begin()
+        t = manager.run_embedding(algo_file, state, vnr, arrivals, isolate)
+        if t is None or len(t) < 4 or t[3] == False:
+            state.rollback()
+            vne_log.event('vnr_result', time=now, vnr=vnr['vnr_id'], accepted=False)
+            continue
+
+        allocation = state.commit()
+        heapq.heappush(events, (now + rng.expovariate(1 / mean_lifetime), next(sequence), DEPARTURE, vnr['vnr_id']))
+        vm_to_host, connections = manager.extract_vm_to_host(t), manager.extract_connections(t)
+        reve, cos = manager.revenue_and_cost(vnr, vm_to_host, connections)
+        allocations[vnr['vnr_id']] = allocation, accumulator.accept(f"VNR{vnr['vnr_id'] + 1}", vnr, vm_to_host,
+                                                                    connections, reve, cos)
+        window.accepted += 1
+        window.revenue += reve
+        window.cost += cos
+        vne_log.event('vnr_result', time=now, vnr=vnr['vnr_id'], accepted=True, revenue=reve, cost=cos)
+
+    rows.append(window.row(window_length, state, len(allocations), accumulator))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Online VNE simulation with VNR arrivals and departures')
+    parser.add_argument('substrate', help='Substrate pickle, e.g. SN/SN.topo.pickle')
+    parser.add_argument('algorithm', help='Embedding algorithm script, e.g. Energy_Load_Math.py')
+    parser.add_argument('vnrs', help='VNR pickle whose requests are replayed as arrivals')
+    parser.add_argument('--rate', type=float, default=1.0, help='Mean VNR arrivals per time unit')
+    parser.add_argument('--lifetime', type=float, default=50.0, help='Mean VNR lifetime in time units')
+    parser.add_argument('--arrivals', type=int, default=10000, help='Number of VNR arrivals to simulate')
+    parser.add_argument('--window', type=float, default=100.0, help='Length of a metrics window in time units')
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--isolate', action='store_true', help='Run the algorithm as a subprocess per VNR')
+    parser.add_argument('--split-links', action='store_true',
+                        help='Route virtual links that fit no single path over several paths (multipath.py)')
+    parser.add_argument('--metrics', default='OUTPUT/simulation.sqlite', help='SQLite file for the window rows')
+    parser.add_argument('--log-level', choices=sorted(vne_log.LEVELS), default='quiet')
+    parser.add_argument('--events', help='Append structured JSON-lines events to this file')
+    args = parser.parse_args()
+    vne_log.configure(args.log_level, args.events)
+    multipath.configure(args.split_links)
+
+    start_time = time.time()
+    rows = simulate(args.substrate, args.algorithm, manager.load_network_data(args.vnrs), args.rate, args.lifetime,
+                    args.arrivals, args.window, args.seed, args.isolate)
+    elapsed = time.time() - start_time
+
+    with MetricsWriter(args.metrics, table='simulation') as writer:
+        for row in rows:
+            writer.append(args.algorithm, row)
+
+    accepted = sum(row["Accepted"] for row in rows)
+    revenue = sum(row["Revenue"] for row in rows)
+    cost = sum(row["Cost"] for row in rows)
+    print(f"{args.arrivals} arrivals in {elapsed:.2f} seconds ({args.arrivals / elapsed:.0f} VNRs/s), "
+          f"acceptance ratio {accepted / args.arrivals * 100:.2f}%, R/C ratio {revenue / cost if cost else 0:.4f}")
+    print(f"{len(rows)} window rows written to {args.metrics}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,158 @@
+import numpy as np
+from routing import PathCache, link_key
+from cpu_index import ResidualCPUIndex
+
+
+class SubstrateState:
+    # Long-lived view of the substrate network shared by manager.algo and the embedding algorithms.
+    # Built once per run from the SN topology dict and then mutated in place; every change made
+    # between begin() and commit() is journaled so a failed VNR can be rolled back exactly.
+    # graph[u][v] and graph[v][u] are the same edge record as edges[link_key(u, v)], so a link's
+    # residual bandwidth is changed once and both directions see it.
+    # Server residual, original and used CPU are mirrored in numpy arrays (position server_pos[id])
+    # together with running sums for the mean/std of the residual CPU, for vectorized node scoring.
+    # cpu_index (cpu_index.ResidualCPUIndex) answers which servers fit a demand without scanning them all.
+    # uplink[pos] is the residual bandwidth summed over the links of that server (admission.py).
+
+    def __init__(self, sn_topology, path_index=None):
+        self.topology = sn_topology
+        # A host's original_cores (see to_topology) is its capacity when allocated_cores is a residual
+        self.servers = {f'h{i + 1}': {'cpu': sn_topology[f'h{i + 1}']['allocated_cores'],
+                                      'original_cpu': sn_topology[f'h{i + 1}'].get(
+                                          'original_cores', sn_topology[f'h{i + 1}']['allocated_cores']),
+                                      'vms': []}
+                        for i in range(sn_topology['num_hosts'])}
+        self.server_ids = list(self.servers)
+        self.server_pos = {server_id: pos for pos, server_id in enumerate(self.server_ids)}
+        self.cpu = np.array([self.servers[s]['cpu'] for s in self.server_ids], dtype=float)
+        self.original_cpu = np.array([self.servers[s]['original_cpu'] for s in self.server_ids], dtype=float)
+        self.used_cpu = self.original_cpu - self.cpu
+        self.cpu_index = ResidualCPUIndex(self.cpu)
+        self._cpu_sum = sum(server['cpu'] for server in self.servers.values())
+        self._cpu_sq_sum = sum(server['cpu'] ** 2 for server in self.servers.values())
+
+        self.links = []  # (node1, node2) in the order of links_details
+        self.edges = {}
+        self.graph = {}
+        for link in sn_topology['links_details']:
+            node1, node2, bw = link['node1'], link['node2'], link['assigned_bandwidth']
+            self.links.append((node1, node2))
+            edge = self.edges.setdefault(link_key(node1, node2), {'bandwidth': bw})
+            self.graph.setdefault(node1, {})[node2] = edge
+            self.graph.setdefault(node2, {})[node1] = edge  # Assume undirected graph
+
+        self._total_bandwidth = sum(edge['bandwidth'] for edge in self.edges.values())
+        self.uplink = np.array([sum(edge['bandwidth'] for edge in self.graph.get(s, {}).values())
+                                for s in self.server_ids], dtype=float)
+        # Invalidated link by link as residual bandwidth changes; path_index is a path_index.PathIndex
+        self.routes = PathCache(self.graph, index=path_index)
+
+        self.link_flags = {(node1, node2): False for node1, node2 in self.links}
+        self.link_flags.update({(node2, node1): False for node1, node2 in self.links})
+        self._journal = None
+
+    def begin(self):
+        self._journal = []
+
+    def commit(self):
+        # Returns the allocations made in the transaction; release() gives them back when the VNR departs
+        allocation, self._journal = self._journal, None
+        return allocation or []
+
+    def rollback(self):
+        if self._journal is None:
+            return
+        journal, self._journal = self._journal, None
+        self._undo(journal)
+
+    def release(self, allocation):
+        # Called between transactions, with the record returned by commit()
+        self._undo(allocation)
+
+    def _undo(self, entries):
+        for entry in reversed(entries):
+            if entry[0] == 'vm':
+                _, server_id, vm = entry
+                self._adjust_cpu(server_id, vm['cpu'])
+                self.servers[server_id]['vms'].remove(vm)
+            elif entry[0] == 'vm_release':
+                _, server_id, vm = entry
+                self._adjust_cpu(server_id, -vm['cpu'])
+                self.servers[server_id]['vms'].append(vm)
+            else:
+                _, path, bandwidth = entry
+                self._adjust_path(path, bandwidth)
+
+    def place_vm(self, server_id, vnr_id, vm_index, cpu):
+        vm = {'vnr_id': vnr_id, 'vm_index': vm_index, 'cpu': cpu}
+        self._adjust_cpu(server_id, -cpu)
+        self.servers[server_id]['vms'].append(vm)
+        if self._journal is not None:
+            self._journal.append(('vm', server_id, vm))
+        return vm
+
+    def release_vm(self, server_id, vm):
+        self._adjust_cpu(server_id, vm['cpu'])
+        self.servers[server_id]['vms'].remove(vm)
+        if self._journal is not None:
+            self._journal.append(('vm_release', server_id, vm))
+
+    def _adjust_cpu(self, server_id, delta):
+        server = self.servers[server_id]
+        old = server['cpu']
+        server['cpu'] = old + delta
+        pos = self.server_pos[server_id]
+        previous = self.cpu[pos]
+        self.cpu[pos] += delta
+        self.used_cpu[pos] -= delta
+        self.cpu_index.update(pos, previous, self.cpu[pos])
+        self._cpu_sum += delta
+        self._cpu_sq_sum += server['cpu'] ** 2 - old ** 2
+
+    def cpu_mean_std(self):
+        # Mean and sample standard deviation (ddof=1) of the residual CPU, from the running sums
+        n = len(self.server_ids)
+        mean = self._cpu_sum / n
+        variance = (self._cpu_sq_sum - self._cpu_sum * mean) / (n - 1) if n > 1 else 0.0
+        return mean, max(np.sqrt(max(variance, 0.0)), 1e-6)  # Prevent division by zero
+
+    def reserve_path(self, path, bandwidth):
+        self._adjust_path(path, -bandwidth)
+        if self._journal is not None:
+            self._journal.append(('path', path, bandwidth))
+
+    def release_path(self, path, bandwidth):
+        self._adjust_path(path, bandwidth)
+        if self._journal is not None:
+            self._journal.append(('path', path, -bandwidth))
+
+    def edge(self, u, v):
+        return self.edges[link_key(u, v)]
+
+    def _adjust_path(self, path, delta):
+        for u, v in zip(path, path[1:]):
+            edge = self.edges[link_key(u, v)]
+            edge['bandwidth'] += delta
+            self.routes.link_changed(u, v, edge['bandwidth'] - delta, edge['bandwidth'])
+            for node in (u, v):
+                pos = self.server_pos.get(node)
+                if pos is not None:
+                    self.uplink[pos] += delta
+        self._total_bandwidth += delta * (len(path) - 1)
+
+    def total_cpu(self):
+        return self._cpu_sum
+
+    def total_bandwidth(self):
+        return self._total_bandwidth
+
+    def to_topology(self):
+        # SN topology dict with the current residual capacities, for algorithms run as a subprocess. Hosts
+        # keep their capacity as original_cores, so a state built from it scores servers as this one does.
+        topology = dict(self.topology)
+        for server_id, server in self.servers.items():
+            topology[server_id] = dict(self.topology[server_id], allocated_cores=server['cpu'],
+                                       original_cores=server['original_cpu'])
+        topology['links_details'] = [dict(link, assigned_bandwidth=self.edge(link['node1'], link['node2'])['bandwidth'])
+                                     for link in self.topology['links_details']]
+        return topology
@@ -0,0 +1,217 @@
+import argparse
+import importlib.util
+import os
+import pickle
+import numpy as np
+import vne_log
+import workload_store
+
+# Substrate network builder, in pure Python: writes the SN topology dict (h<i>: {'allocated_cores'},
+# num_hosts, links_details) without bringing up Mininet. Switches are s<i> (datapath i for the Ryu
+# controller), hosts h<i>. Host CPU and bandwidths are drawn with the same four distributions as the
+# VNRs (VNE.generator): 1 random, 2 uniform, 3 normal, 4 Poisson. Links that touch a host draw from the
+# host bandwidth range, switch-to-switch links from the switch range.
+#
+# Topologies, as a "kind" or "kind:a,b,...":
+#   tree:DEPTH,FANOUT          Mininet's TreeTopo (default: depth and fanout of SN-Input-File.txt)
+#   fat-tree:K                 k-ary fat-tree, K even: K^3/4 hosts
+#   leaf-spine:LEAVES,SPINES,HOSTS_PER_LEAF
+#   bcube:N,K                  BCube_K of N-port switches: N^(K+1) hosts, which also relay traffic
+#   random:HOSTS,SWITCHES,DEGREE   connected random switch graph of mean degree DEGREE, hosts on random switches
+#
+#   python substrate_generator.py SN-Input-File.txt 1 SN/SN.topo.pickle --topology fat-tree:16
+
+_generator = None
+
+
+def _draw(rng, low, high, count, ch):
+    global _generator
+    if _generator is None:
+        path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'VNE.generator.py')
+        spec = importlib.util.spec_from_file_location('vne_generator', path)
+        _generator = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(_generator)
+    return _generator._draw(rng, low, high, count, ch)
+
+
+class _Builder:
+    def __init__(self):
+        self.hosts = 0
+        self.switches = 0
+        self.links = []  # (node1, node2)
+
+    def host(self):
+        self.hosts += 1
+        return f'h{self.hosts}'
+
+    def switch(self):
+        self.switches += 1
+        return f's{self.switches}'
+
+    def link(self, node1, node2):
+        self.links.append((node1, node2))
+
+
+def tree(depth, fanout):
+    # Same names and link order as Mininet's TreeTopo, so substrates built either way match
+    builder = _Builder()
+
+    def add_tree(depth):
+        if depth == 0:
+            return builder.host()
+        node = builder.switch()
+        for _ in range(fanout):
+            builder.link(node, add_tree(depth - 1))
+        return node
+
+    add_tree(depth)
+    return builder
+
+
+def fat_tree(k):
+    if k < 2 or k % 2:
+        raise ValueError("fat-tree needs an even K >= 2")
+    half = k // 2
+    builder = _Builder()
+    core = [builder.switch() for _ in range(half * half)]
+    for pod in range(k):
+        aggregation = [builder.switch() for _ in range(half)]
+        edge = [builder.switch() for _ in range(half)]
+        for i, switch in enumerate(aggregation):
+            for core_switch in core[i * half:(i + 1) * half]:
+                builder.link(core_switch, switch)
+            for edge_switch in edge:
+                builder.link(switch, edge_switch)
+        for edge_switch in edge:
+            for _ in range(half):
+                builder.link(edge_switch, builder.host())
+    return builder
+
+
+def leaf_spine(leaves, spines, hosts_per_leaf):
+    builder = _Builder()
+    spine = [builder.switch() for _ in range(spines)]
+    for _ in range(leaves):
+        leaf = builder.switch()
+        for spine_switch in spine:
+            builder.link(spine_switch, leaf)
+        for _ in range(hosts_per_leaf):
+            builder.link(leaf, builder.host())
+    return builder
+
+
+def bcube(n, k):
+    # Host x connects at level l to the switch of the hosts that differ from x only in base-n digit l
+    builder = _Builder()
+    hosts = [builder.host() for _ in range(n ** (k + 1))]
+    levels = [[builder.switch() for _ in range(n ** k)] for _ in range(k + 1)]
+    for level, switches in enumerate(levels):
+        low = n ** level
+        for x, host in enumerate(hosts):
+            builder.link(switches[(x // (low * n)) * low + x % low], host)
+    return builder
+
+
+def random_graph(hosts, switches, degree, rng):
+    builder = _Builder()
+    names = [builder.switch() for _ in range(switches)]
+    pairs = set()
+    for i in range(1, switches):  # Random spanning tree first, so the substrate is connected
+        pairs.add((int(rng.integers(i)), i))
+    extra = max(0, switches * degree // 2 - len(pairs))
+    extra = min(extra, switches * (switches - 1) // 2 - len(pairs))
+    while extra:
+        i, j = sorted(int(v) for v in rng.integers(switches, size=2))
+        if i != j and (i, j) not in pairs:
+            pairs.add((i, j))
+            extra -= 1
+    for i, j in sorted(pairs):
+        builder.link(names[i], names[j])
+    for switch in rng.integers(switches, size=hosts):
+        builder.link(names[switch], builder.host())
+    return builder
+
+
+TOPOLOGIES = {
+    'tree': (tree, 2),
+    'fat-tree': (fat_tree, 1),
+    'leaf-spine': (leaf_spine, 3),
+    'bcube': (bcube, 2),
+    'random': (random_graph, 3),
+}
+
+
+def parse_topology(text):
+    # "fat-tree:8" -> ('fat-tree', [8]); "tree" -> ('tree', [])
+    kind, _, params = text.partition(':')
+    if kind not in TOPOLOGIES:
+        raise ValueError(f"Unknown topology {kind!r}, expected one of {', '.join(TOPOLOGIES)}")
+    params = [int(p) for p in params.split(',')] if params else []
+    if params and len(params) != TOPOLOGIES[kind][1]:
+        raise ValueError(f"{kind} takes {TOPOLOGIES[kind][1]} parameters, got {len(params)}")
+    return kind, params
+
+
+def build(kind, params, cpu_range, host_bw_range, switch_bw_range, ch, rng=None):
+    rng = np.random.default_rng() if rng is None else rng
+    function, _ = TOPOLOGIES[kind]
+    builder = function(*params, rng) if kind == 'random' else function(*params)
+
+    cores = _draw(rng, cpu_range[0], cpu_range[1], builder.hosts, ch)
+    sn_topology = {f'h{i + 1}': {'allocated_cores': int(c)} for i, c in enumerate(cores)}
+    sn_topology['num_hosts'] = builder.hosts
+    to_host = np.array([node1[0] == 'h' or node2[0] == 'h' for node1, node2 in builder.links], dtype=bool)
+    bandwidth = np.empty(len(builder.links), dtype=np.int64)
+    bandwidth[to_host] = _draw(rng, host_bw_range[0], host_bw_range[1], int(to_host.sum()), ch)
+    bandwidth[~to_host] = _draw(rng, switch_bw_range[0], switch_bw_range[1], int((~to_host).sum()), ch)
+    sn_topology['links_details'] = [{'node1': node1, 'node2': node2, 'assigned_bandwidth': int(bw)}
+                                    for (node1, node2), bw in zip(builder.links, bandwidth.tolist())]
+    return sn_topology
+
+
+def read_args_file(args_file):
+    # SN-Input-File.txt: depth fanout cpu_low cpu_high host_bw_low host_bw_high switch_bw_low switch_bw_high
+    with open(args_file, 'r') as file:
+        values = [int(v) for v in file.readline().split()]
+    depth, fanout = values[0], values[1]
+    return depth, fanout, tuple(values[2:4]), tuple(values[4:6]), tuple(values[6:8])
+
+
+def generate(args_file, ch, output_path, topology=None, seed=None):
+    # Builds the substrate described by args_file (tree of its depth and fanout unless topology is given)
+    # and writes it to output_path: a pickle, or a columnar store if it ends in .cols
+    depth, fanout, cpu_range, host_bw_range, switch_bw_range = read_args_file(args_file)
+    kind, params = parse_topology(topology or 'tree')
+    if kind == 'tree' and not params:
+        params = [depth, fanout]
+    elif not params:
+        raise ValueError(f"{kind} needs its parameters, e.g. {kind}:{','.join(['4'] * TOPOLOGIES[kind][1])}")
+    sn_topology = build(kind, params, cpu_range, host_bw_range, switch_bw_range, int(ch),
+                        np.random.default_rng(seed))
+
+    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+    if output_path.endswith(workload_store.SUFFIX):
+        workload_store.save_substrate(output_path, sn_topology)
+    else:
+        with open(output_path + '.tmp', 'wb') as file:
+            pickle.dump(sn_topology, file)
+        os.replace(output_path + '.tmp', output_path)
+    vne_log.info(f"Substrate {kind}{params}: {sn_topology['num_hosts']} hosts, "
+                 f"{len(sn_topology['links_details'])} links written to {output_path}")
+    return sn_topology
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build a substrate network topology without Mininet')
+    parser.add_argument('args_file', help='Capacity ranges (and tree shape), e.g. SN-Input-File.txt')
+    parser.add_argument('ch', type=int, choices=[1, 2, 3, 4], help='Capacity distribution')
+    parser.add_argument('output_file', help='Substrate pickle, or a columnar store if it ends in .cols')
+    parser.add_argument('--topology', help='tree[:DEPTH,FANOUT], fat-tree:K, leaf-spine:LEAVES,SPINES,HOSTS_PER_LEAF, '
+                                           'bcube:N,K or random:HOSTS,SWITCHES,DEGREE')
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args()
+    generate(args.args_file, args.ch, args.output_file, args.topology, args.seed)
+
+
+if __name__ == '__main__':
+    main()
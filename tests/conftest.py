@@ -0,0 +1,16 @@
+import os
+import sys
+import numpy as np
+import pytest
+
+# The modules live at the top of the repository, not in a package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import substrate_generator
+
+
+@pytest.fixture
+def leaf_spine():
+    # 3 leaves, 2 spines, 2 hosts per leaf: h1..h6, two 2-hop-apart spines between any two leaves
+    return substrate_generator.build('leaf-spine', [3, 2, 2], (8, 16), (20, 40), (10, 20), 1,
+                                     np.random.default_rng(7))
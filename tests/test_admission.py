@@ -0,0 +1,64 @@
+import importlib.util
+import os
+from collections import deque
+import admission
+import benchmark
+import manager
+import vne_log
+from substrate import SubstrateState
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def load(name):
+    spec = importlib.util.spec_from_file_location(name.replace('.', '_'), os.path.join(HERE, '..', name + '.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def vnr(cpu, links, bandwidth):
+    return {'num_vms': len(cpu), 'vm_cpu_cores': cpu, 'vm_links': links, 'bandwidth_values': bandwidth,
+            'vnr_id': 0}
+
+
+def test_reasons(leaf_spine):
+    state = SubstrateState(leaf_spine)
+    largest_cpu = max(state.cpu)
+    assert admission.check(state, vnr([1, 1], [(0, 1)], [1])) is None
+    assert admission.check(state, vnr([1] * 7, [(i, i + 1) for i in range(6)], [1] * 6)).startswith('7 linked VMs')
+    assert 'exceeds the residual CPU' in admission.check(state, vnr([40] * 6, [(i, i + 1) for i in range(5)], [1] * 5))
+    assert 'residual CPU' in admission.check(state, vnr([largest_cpu + 1, 1], [(0, 1)], [1]))
+    assert 'residual bandwidth' in admission.check(state, vnr([1, 1], [(0, 1)], [max(state.uplink) + 1]))
+    assert admission.check(state, vnr([1000], [], [])) is None  # Only linked VMs decide the outcome
+
+
+def test_never_rejects_an_embeddable_vnr():
+    vne_log.configure('quiet')
+    algorithm = load('Energy_Load_Math')
+    generator = load('VNE.generator')
+    rejected = 0
+    for hosts, active in [(10, 50), (30, 400)]:
+        state = SubstrateState(benchmark.synthetic_substrate(hosts, 1))
+        allocations = deque()
+        for request in generator.generate_vne_requests(600, (2, 5), (1, 10), (1, 5), 1, generator.vnr_rng(1, 600, 7)):
+            reason = admission.check(state, request)
+            state.begin()
+            assignments, _, _ = algorithm.node_embedding_and_mapping(state, request)
+            success, _, _ = algorithm.link_embedding_and_mapping(state, request, assignments)
+            embedded = all(success.values())
+            assert not (reason and embedded), reason
+            rejected += bool(reason)
+            if embedded:
+                allocations.append(state.commit())
+                if len(allocations) > active:
+                    state.release(allocations.popleft())
+            else:
+                state.rollback()
+    assert rejected  # The workload does load the substrate enough to reject
+
+
+def test_isolated_runs_use_the_check_the_script_exposes():
+    assert manager.load_admission_check(os.path.join(HERE, '..', 'Energy_Load_Math.py')) is admission.check
+    assert load('Energy_Load_Math').admission_check is admission.check
+    assert manager.load_admission_check('First_Fit.py') is None
@@ -0,0 +1,39 @@
+import numpy as np
+from cpu_index import ResidualCPUIndex
+
+
+def brute_best_fit(cpu, demand, excluded):
+    fits = [(residual, pos) for pos, residual in enumerate(cpu) if residual >= demand and not excluded[pos]]
+    return min(fits)[1] if fits else None
+
+
+def brute_first_fit(cpu, demand, start):
+    return next((pos for pos in range(start, len(cpu)) if cpu[pos] >= demand), None)
+
+
+def test_matches_brute_force_under_random_updates():
+    rng = np.random.default_rng(1)
+    for size in (1, 2, 5, 37):
+        cpu = rng.integers(0, 20, size).astype(float)
+        index = ResidualCPUIndex(cpu)
+        for _ in range(300):
+            pos = int(rng.integers(size))
+            new = float(rng.integers(0, 20)) + (0.5 if rng.random() < 0.2 else 0.0)
+            index.update(pos, cpu[pos], new)
+            cpu[pos] = new
+
+            demand = float(rng.integers(0, 22))
+            excluded = rng.random(size) < 0.3
+            start = int(rng.integers(size))
+            assert index.count_at_least(demand) == int((cpu >= demand).sum())
+            assert sorted(index.at_least(demand).tolist()) == np.flatnonzero(cpu >= demand).tolist()
+            assert index.best_fit(demand) == brute_best_fit(cpu, demand, np.zeros(size, dtype=bool))
+            assert index.best_fit(demand, excluded) == brute_best_fit(cpu, demand, excluded)
+            assert index.first_fit(demand, start) == brute_first_fit(cpu, demand, start)
+
+
+def test_at_least_is_ordered_by_residual():
+    index = ResidualCPUIndex([5, 1, 9, 5, 3])
+    assert index.at_least(4).tolist() == [0, 3, 2]
+    assert index.best_fit(10) is None
+    assert index.first_fit(6, 3) is None
@@ -0,0 +1,38 @@
+import importlib.util
+import os
+import numpy as np
+import pytest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+spec = importlib.util.spec_from_file_location('vne_generator', os.path.join(HERE, '..', 'VNE.generator.py'))
+generator = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(generator)
+
+
+def test_pair_inverts_the_row_major_pair_index():
+    for m in range(2, 60):
+        pairs = [(i, j) for i in range(m) for j in range(i + 1, m)]
+        src, dst = generator._pair(np.full(len(pairs), m), np.arange(len(pairs)))
+        assert list(zip(src.tolist(), dst.tolist())) == pairs
+
+
+def test_pair_at_large_sizes():
+    m = np.full(4, 100000)
+    k = np.array([0, 1, m[0] - 2, m[0] * (m[0] - 1) // 2 - 1])
+    src, dst = generator._pair(m, k)
+    assert src.tolist() == [0, 0, 0, m[0] - 2]
+    assert dst.tolist() == [1, 2, m[0] - 1, m[0] - 1]
+
+
+@pytest.mark.parametrize('ch', [1, 2, 3, 4])
+def test_batch_links_are_distinct_pairs_of_the_request(ch):
+    batch = generator.generate_vnr_batch(200, (2, 8), (1, 10), (1, 50), ch, np.random.default_rng(ch))
+    for vnr in generator.batch_to_requests(batch):
+        links = vnr['vm_links']
+        assert len(set(links)) == len(links) == len(vnr['bandwidth_values'])
+        assert all(0 <= src < dst < vnr['num_vms'] for src, dst in links)
+
+
+def test_invalid_choice():
+    with pytest.raises(ValueError):
+        generator.generate_vnr_batch(1, (2, 3), (1, 2), (1, 2), 5)
@@ -0,0 +1,86 @@
+import csv
+import random
+from metrics import MetricsAccumulator, P_FULL, P_IDLE
+from routing import link_key
+from substrate import SubstrateState
+
+
+def recompute(state, active, offered, accepted):
+    # The snapshot's figures computed from scratch: active is [(vm_to_host, connections)] of the VNRs
+    # embedded now, accepted [(vnr, connections)] of every VNR accepted so far
+    used = {server for vm_to_host, _ in active for server in vm_to_host.values()}
+    links = {link_key(u, v) for _, connections in active for _, path, _ in connections
+             for u, v in zip(path, path[1:])}
+    energy = {}
+    for server, info in state.servers.items():
+        load = (info['original_cpu'] - info['cpu']) / info['original_cpu']
+        energy[server] = round(P_IDLE + (P_FULL - P_IDLE) * load, 2)
+    listed = list(dict.fromkeys(state.links))
+    links_used = sum(link_key(node1, node2) in links for node1, node2 in listed)
+    paths = [path for _, connections in accepted for _, path, _ in connections]
+    used_energy = sum([energy[server] for server in used], 0.0)
+    return {
+        "Number of VNRs": offered,
+        "Number of Servers Used": len(used),
+        "Number of Idle Servers": len(state.servers) - len(used),
+        "Number of Links Used": links_used,
+        "Number of Idle Links": len(listed) - links_used,
+        "Total VMs embedded": sum(len(vnr['vm_cpu_cores']) for vnr, _ in accepted),
+        "Total VLs embedded": sum(len(vnr['vm_links']) for vnr, _ in accepted),
+        "Average Path Length": round(sum(len(path) for path in paths) / len(paths), 2) if paths else 0,
+        "Total Energy of Embedded servers only in SN": f"{round(used_energy, 2)} Watts",
+        "Total Energy of SN": f"{round(sum(energy.values()), 2)} Watts",
+    }
+
+
+def test_snapshot_matches_a_recomputation_after_accepts_and_departures(leaf_spine, tmp_path):
+    rng = random.Random(5)
+    state = SubstrateState(leaf_spine)
+    mapping_path = tmp_path / 'mappings' / 'run.csv'
+    accumulator = MetricsAccumulator(state, str(mapping_path))
+    active, accepted, offered = [], [], 0
+    for step in range(80):
+        if active and rng.random() < 0.4:
+            allocation, record, _ = active.pop(rng.randrange(len(active)))
+            state.release(allocation)
+            accumulator.depart(record)
+        else:
+            servers = rng.sample(sorted(state.servers), rng.randint(2, 3))
+            vnr = {'vnr_id': step, 'vm_cpu_cores': [rng.randint(1, 4) for _ in servers],
+                   'vm_links': [(i, i + 1) for i in range(len(servers) - 1)],
+                   'bandwidth_values': [rng.randint(1, 6) for _ in servers[1:]]}
+            accumulator.offer(vnr)
+            offered += 1
+            state.begin()
+            embedded = all(state.servers[server]['cpu'] >= cpu for server, cpu in zip(servers, vnr['vm_cpu_cores']))
+            connections = []
+            if embedded:
+                for i, (server, cpu) in enumerate(zip(servers, vnr['vm_cpu_cores']), start=1):
+                    state.place_vm(server, step, i, cpu)
+                for (source, target), bandwidth in zip(vnr['vm_links'], vnr['bandwidth_values']):
+                    path = state.routes.path(servers[source], servers[target], bandwidth)
+                    if path is None:
+                        embedded = False
+                        break
+                    state.reserve_path(path, bandwidth)
+                    connections.append(((servers[source], servers[target], step), path, bandwidth))
+            if not embedded:
+                state.rollback()
+                continue
+            allocation = state.commit()
+            vm_to_host = {f"VM{i}": server for i, server in enumerate(servers, start=1)}
+            record = accumulator.accept(f"VNR{step}", vnr, vm_to_host, connections, 2.0, 4.0)
+            active.append((allocation, record, (vm_to_host, connections)))
+            accepted.append((vnr, connections))
+
+        snapshot = accumulator.snapshot()
+        expected = recompute(state, [mapping for _, _, mapping in active], offered, accepted)
+        assert {column: snapshot[column] for column in expected} == expected
+    accumulator.close()
+
+    assert accepted and len(active) < len(accepted)  # Both accepts and departures happened
+    assert accumulator.snapshot()["Avg R/C Ratio"] == 0.5
+    with open(mapping_path, newline='') as file:
+        rows = list(csv.reader(file))
+    assert rows[0] == ['VNR', 'VM', 'Server']
+    assert len(rows) - 1 == sum(len(vnr['vm_cpu_cores']) for vnr, _ in accepted)
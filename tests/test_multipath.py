@@ -0,0 +1,64 @@
+import numpy as np
+import multipath
+from routing import link_key
+from substrate import SubstrateState
+
+
+def two_paths():
+    # h1 - s1 - {s2, s3} - s4 - h2: two disjoint 3-hop cores of 6 units, host links of 20
+    links = [('h1', 's1', 20), ('s1', 's2', 6), ('s2', 's4', 6), ('s1', 's3', 6), ('s3', 's4', 6), ('s4', 'h2', 20),
+             ('h3', 's1', 20)]
+    return {'h1': {'allocated_cores': 4}, 'h2': {'allocated_cores': 4}, 'h3': {'allocated_cores': 4},
+            'num_hosts': 3,
+            'links_details': [{'node1': a, 'node2': b, 'assigned_bandwidth': bw} for a, b, bw in links]}
+
+
+def check_flows(state, demands, flows):
+    load = {}
+    for (src, dst, bandwidth), shares in zip(demands, flows):
+        assert sum(share for _, share in shares) == bandwidth
+        for path, share in shares:
+            assert isinstance(share, int) and (share > 0 or bandwidth == 0)
+            assert path[0] == src and path[-1] == dst
+            for u, v in zip(path, path[1:]):
+                load[link_key(u, v)] = load.get(link_key(u, v), 0) + share
+    for key, used in load.items():
+        assert used <= state.edges[key]['bandwidth']
+
+
+def test_splits_a_demand_no_single_path_carries():
+    state = SubstrateState(two_paths())
+    assert state.routes.path('h1', 'h2', 9) is None
+    demands = [('h1', 'h2', 9)]
+    flows = multipath.split_flows(state, demands)
+    assert len(flows[0]) == 2
+    check_flows(state, demands, flows)
+
+
+def test_shares_are_integers_that_add_up_to_each_demand():
+    state = SubstrateState(two_paths())
+    demands = [('h1', 'h2', 5), ('h3', 'h2', 6), ('h1', 'h1', 3)]
+    flows = multipath.split_flows(state, demands)
+    check_flows(state, demands, flows)
+    assert flows[2] == [(['h1'], 3)]
+
+
+def test_a_demand_without_bandwidth_gets_a_path_with_no_share():
+    state = SubstrateState(two_paths())
+    demands = [('h1', 'h2', 9), ('h3', 'h2', 0)]
+    flows = multipath.split_flows(state, demands)
+    check_flows(state, demands, flows)
+    assert flows[1] == [(state.routes.path('h3', 'h2', 0), 0)]
+
+
+def test_infeasible_demands():
+    state = SubstrateState(two_paths())
+    assert multipath.split_flows(state, [('h1', 'h2', 13)]) is None  # More than both cores
+    assert multipath.split_flows(state, [('h1', 'h2', 21)]) is None  # More than the host link
+    assert multipath.split_flows(state, [('h1', 'h2', 7), ('h3', 'h2', 6)]) is None
+
+
+def test_round_shares_by_largest_remainder():
+    columns = [(0, ['a']), (0, ['b']), (0, ['c']), (1, ['d']), (1, ['e'])]
+    x = np.array([2.5, 3.7, 0.8, 4.9999999, 1e-9])
+    assert multipath._round_shares(columns, x, [(None, None, 7), (None, None, 5)]).tolist() == [2, 4, 1, 5, 0]
@@ -0,0 +1,71 @@
+import random
+import path_index
+from routing import k_shortest_paths, link_key, shortest_path
+from substrate import SubstrateState
+
+
+def simple_paths(graph, src, dst, demand, path=None):
+    path = path or [src]
+    if path[-1] == dst:
+        yield path
+        return
+    for neighbor, edge in graph[path[-1]].items():
+        if neighbor not in path and edge['bandwidth'] >= demand:
+            yield from simple_paths(graph, src, dst, demand, path + [neighbor])
+
+
+def test_yen_returns_the_k_shortest_loopless_paths_in_order(leaf_spine):
+    graph = SubstrateState(leaf_spine).graph
+    hosts = [f'h{i + 1}' for i in range(leaf_spine['num_hosts'])]
+    for src in hosts:
+        for dst in hosts:
+            for demand in (0, 15):
+                lengths = sorted(len(path) for path in simple_paths(graph, src, dst, demand))
+                paths = k_shortest_paths(graph, src, dst, demand, 4)
+                assert [len(path) for path in paths] == lengths[:4]
+                assert len({tuple(path) for path in paths}) == len(paths)
+                for path in paths:
+                    assert path[0] == src and path[-1] == dst and len(set(path)) == len(path)
+                    assert all(graph[u][v]['bandwidth'] >= demand for u, v in zip(path, path[1:]))
+                if paths:
+                    assert len(shortest_path(graph, src, dst, demand)) == len(paths[0])
+
+
+def test_cached_path_is_invalidated_when_its_link_runs_short(leaf_spine):
+    state = SubstrateState(leaf_spine)
+    path = state.routes.path('h1', 'h3', 5)
+    middle = path[1:3]  # Leaf to spine
+    assert state.routes.path('h1', 'h3', 5) is path  # Cached
+
+    spare = state.edge(*middle)['bandwidth']
+    state.reserve_path(middle, spare - 4)  # link_changed drops the entries routed over it
+    rerouted = state.routes.path('h1', 'h3', 5)
+    assert link_key(*middle) not in {link_key(u, v) for u, v in zip(rerouted, rerouted[1:])}
+
+    state.release_path(middle, spare - 4)
+    assert len(state.routes.path('h1', 'h3', 5)) == len(path)
+
+
+def test_increase_reopens_paths_for_the_threshold():
+    topology = {'h1': {'allocated_cores': 4}, 'h2': {'allocated_cores': 4}, 'num_hosts': 2,
+                'links_details': [{'node1': 'h1', 'node2': 's1', 'assigned_bandwidth': 10},
+                                  {'node1': 's1', 'node2': 'h2', 'assigned_bandwidth': 2}]}
+    state = SubstrateState(topology)
+    assert state.routes.path('h1', 'h2', 5) is None
+    state.release_path(['s1', 'h2'], 3)
+    assert state.routes.path('h1', 'h2', 5) == ['h1', 's1', 'h2']
+
+
+def test_path_index_gives_the_same_path_lengths(leaf_spine):
+    rng = random.Random(3)
+    plain = SubstrateState(leaf_spine)
+    indexed = SubstrateState(leaf_spine, path_index.build(leaf_spine, sources=2))
+    hosts = [f'h{i + 1}' for i in range(leaf_spine['num_hosts'])]
+    for _ in range(200):
+        src, dst = rng.sample(hosts, 2)
+        demand, k = rng.randint(1, 25), rng.randint(1, 4)
+        expected = plain.routes.paths(src, dst, demand, k)
+        assert [len(path) for path in indexed.routes.paths(src, dst, demand, k)] == [len(p) for p in expected]
+        if expected and rng.random() < 0.5:
+            for state in (plain, indexed):
+                state.reserve_path(expected[0], demand)
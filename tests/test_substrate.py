@@ -0,0 +1,86 @@
+from substrate import SubstrateState
+
+
+def snapshot(state):
+    return {
+        'cpu': state.cpu.tolist(),
+        'used_cpu': state.used_cpu.tolist(),
+        'servers': {server: (info['cpu'], list(info['vms'])) for server, info in state.servers.items()},
+        'bandwidth': {key: edge['bandwidth'] for key, edge in state.edges.items()},
+        'uplink': state.uplink.tolist(),
+        'index': list(state.cpu_index._sorted),
+        'order': state.cpu_index.order.tolist(),
+        'total_cpu': state.total_cpu(),
+        'total_bandwidth': state.total_bandwidth(),
+        'mean_std': state.cpu_mean_std(),
+    }
+
+
+def embed_some(state):
+    state.place_vm('h1', 0, 1, 3)
+    state.place_vm('h3', 0, 2, 5)
+    state.place_vm('h3', 0, 3, 1)
+    state.reserve_path(state.routes.path('h1', 'h3', 4), 4)
+    state.reserve_path(state.routes.path('h3', 'h5', 2), 2)
+
+
+def test_rollback_restores_the_state_exactly(leaf_spine):
+    state = SubstrateState(leaf_spine)
+    before = snapshot(state)
+    state.begin()
+    embed_some(state)
+    assert snapshot(state) != before
+    state.rollback()
+    assert snapshot(state) == before
+
+
+def test_release_gives_back_a_committed_allocation(leaf_spine):
+    state = SubstrateState(leaf_spine)
+    state.begin()
+    state.place_vm('h2', 7, 1, 2)
+    state.commit()
+    before = snapshot(state)
+
+    state.begin()
+    embed_some(state)
+    allocation = state.commit()
+    after = snapshot(state)
+    assert after != before
+    state.release(allocation)
+    assert snapshot(state) == before
+
+
+def test_rollback_undoes_releases_within_the_transaction(leaf_spine):
+    state = SubstrateState(leaf_spine)
+    vm = state.place_vm('h4', 1, 1, 6)
+    path = state.routes.path('h4', 'h6', 3)
+    state.reserve_path(path, 3)
+    before = snapshot(state)
+
+    state.begin()
+    state.release_vm('h4', vm)
+    state.release_path(path, 3)
+    state.place_vm('h6', 2, 1, 1)
+    state.rollback()
+    assert snapshot(state) == before
+
+
+def test_running_sums_follow_the_arrays(leaf_spine):
+    state = SubstrateState(leaf_spine)
+    state.begin()
+    embed_some(state)
+    assert state.total_cpu() == state.cpu.sum()
+    assert state.total_bandwidth() == sum(edge['bandwidth'] for edge in state.edges.values())
+    for server, pos in state.server_pos.items():
+        assert state.uplink[pos] == sum(edge['bandwidth'] for edge in state.graph[server].values())
+
+
+def test_a_state_built_from_to_topology_sees_the_same_substrate(leaf_spine):
+    state = SubstrateState(leaf_spine)
+    embed_some(state)
+    copy = SubstrateState(state.to_topology())
+    for name in ('cpu', 'original_cpu', 'used_cpu', 'uplink'):
+        assert getattr(copy, name).tolist() == getattr(state, name).tolist()
+    assert copy.cpu_mean_std() == state.cpu_mean_std()
+    assert {key: edge['bandwidth'] for key, edge in copy.edges.items()} == \
+        {key: edge['bandwidth'] for key, edge in state.edges.items()}
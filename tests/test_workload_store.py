@@ -0,0 +1,44 @@
+import pickle
+import pytest
+import workload_store
+
+
+def test_vnr_requests_round_trip(tmp_path):
+    vnrs = [{'num_vms': 3, 'vm_cpu_cores': [1, 4, 2], 'vm_links': [(0, 1), (1, 2)], 'bandwidth_values': [5, 7],
+             'vnr_id': 0},
+            {'num_vms': 2, 'vm_cpu_cores': [3, 3], 'vm_links': [0, 1], 'bandwidth_values': [9], 'vnr_id': 1},
+            {'num_vms': 1, 'vm_cpu_cores': [6], 'vm_links': [], 'bandwidth_values': [], 'vnr_id': 2}]
+    path = str(tmp_path / 'vnr.cols')
+    workload_store.save_vnr_requests(path, vnrs)
+    loaded = workload_store.load(path)
+    assert len(loaded) == 3
+    assert loaded[1] == dict(vnrs[1], vm_links=[(0, 1)])
+    assert list(loaded)[::2] == vnrs[::2]
+    assert loaded[-1] == vnrs[2]
+    with pytest.raises(IndexError):
+        loaded[3]
+
+
+def test_substrate_round_trip_keeps_every_entry(tmp_path, leaf_spine):
+    leaf_spine['h2']['rack'] = 'r1'
+    leaf_spine['s1'] = {'role': 'spine'}
+    leaf_spine['links_details'][0]['delay'] = 0.5
+    path = str(tmp_path / 'sn.cols')
+    workload_store.save_substrate(path, leaf_spine)
+    assert workload_store.load(path) == leaf_spine
+
+
+def test_substrate_entries_must_be_json(tmp_path, leaf_spine):
+    leaf_spine['s1'] = {'role': object()}
+    with pytest.raises(ValueError):
+        workload_store.save_substrate(str(tmp_path / 'sn.cols'), leaf_spine)
+
+
+def test_convert_from_pickle(tmp_path, leaf_spine):
+    pickle_path = str(tmp_path / 'SN.topo.pickle')
+    with open(pickle_path, 'wb') as file:
+        pickle.dump(leaf_spine, file)
+    store = workload_store.convert(pickle_path)
+    assert store == str(tmp_path / 'SN.topo.cols')
+    assert workload_store.load(store) == leaf_spine
+    assert isinstance(workload_store.load(pickle_path), dict)
@@ -0,0 +1,78 @@
+import json
+import logging
+import os
+import sys
+from collections import deque
+
+# QUIET is the benchmark mode: only warnings and errors are written and, because every detail
+# message below is guarded by enabled(), none of them is even formatted.
+LEVELS = {'quiet': logging.WARNING, 'info': logging.INFO, 'debug': logging.DEBUG}
+QUIET, INFO, DEBUG = LEVELS['quiet'], LEVELS['info'], LEVELS['debug']
+
+logger = logging.getLogger('vne')
+logger.propagate = False
+recent = deque(maxlen=1000)  # Last messages written, bounded so long runs do not grow memory
+
+_handler = logging.StreamHandler(sys.stdout)
+_handler.setFormatter(logging.Formatter('%(message)s'))
+logger.addHandler(_handler)
+
+_events = None
+
+
+def configure(level=None, events_path=None):
+    # level is 'quiet', 'info' or 'debug' (default: $VNE_LOG_LEVEL, else 'info'). The level is exported
+    # through the environment so algorithms run as a subprocess log at the same level.
+    global _events
+    level = (level or os.environ.get('VNE_LOG_LEVEL') or 'info').lower()
+    if level not in LEVELS:
+        raise ValueError(f"Unknown log level {level!r}, expected one of {', '.join(LEVELS)}")
+    os.environ['VNE_LOG_LEVEL'] = level
+    logger.setLevel(LEVELS[level])
+    if events_path is not None:
+        close_events()
+        _events = open(events_path, 'a', buffering=1)  # Line-buffered: one write per event, safe across worker processes
+
+
+def enabled(level):
+    return logger.isEnabledFor(level)
+
+
+def log(level, *args):
+    if logger.isEnabledFor(level):
+        message = ' '.join(str(arg) for arg in args)
+        recent.append(message)
+        logger.log(level, message)
+
+
+def info(*args):
+    log(INFO, *args)
+
+
+def debug(*args):
+    log(DEBUG, *args)
+
+
+def warning(*args):
+    log(logging.WARNING, *args)
+
+
+def events_enabled():
+    return _events is not None
+
+
+def event(name, **fields):
+    # One JSON object per line in the structured event sink, if one is configured
+    if _events is not None:
+        fields['event'] = name
+        _events.write(json.dumps(fields, default=str) + '\n')
+
+
+def close_events():
+    global _events
+    if _events is not None:
+        _events.close()
+        _events = None
+
+
+configure()
@@ -0,0 +1,205 @@
+import argparse
+import json
+import os
+import pickle
+import shutil
+import numpy as np
+
+# Columnar on-disk format for VNR sets and substrates. Each store is a directory with a meta.json and
+# one .npy file per column, loaded memory-mapped: opening a store of millions of VNRs reads only the
+# metadata, and each VNR is built from its slices when it is used.
+#
+# VNR set (kind 'vnr'), CSR layout as produced by VNE.generator.generate_vnr_batch:
+#   vm_offsets, vm_cpu                       VMs of request p: vm_cpu[vm_offsets[p]:vm_offsets[p + 1]]
+#   link_offsets, link_src, link_dst, bandwidth   links of request p: [link_offsets[p]:link_offsets[p + 1]]
+#   vnr_id
+# Substrate (kind 'substrate'): host_cores (host h{i + 1} at index i), link_node1, link_node2 (indices
+# into meta.json's 'nodes') and link_bandwidth, in links_details order. Anything else in the topology
+# dict (other host fields, switch or other top-level entries, other link fields) is kept as JSON in
+# meta.json's 'extra', so it must be JSON-serialisable.
+
+SUFFIX = '.cols'
+VERSION = 1
+VNR_COLUMNS = ('vm_offsets', 'vm_cpu', 'link_offsets', 'link_src', 'link_dst', 'bandwidth', 'vnr_id')
+SUBSTRATE_COLUMNS = ('host_cores', 'link_node1', 'link_node2', 'link_bandwidth')
+
+
+def is_store(path):
+    return os.path.isfile(os.path.join(path, 'meta.json'))
+
+
+def _write(path, kind, columns, **meta):
+    # Written next to the target and renamed into place, so readers never see a half-written store
+    tmp_path = path.rstrip(os.sep) + '.tmp'
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+    for name, values in columns.items():
+        np.save(os.path.join(tmp_path, name + '.npy'), np.ascontiguousarray(values))
+    with open(os.path.join(tmp_path, 'meta.json'), 'w') as file:
+        json.dump(dict(meta, kind=kind, version=VERSION), file)
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp_path, path)
+
+
+def _read(path):
+    with open(os.path.join(path, 'meta.json'), 'r') as file:
+        meta = json.load(file)
+    if meta.get('version') != VERSION:
+        raise ValueError(f"{path}: unsupported store version {meta.get('version')}")
+    columns = VNR_COLUMNS if meta['kind'] == 'vnr' else SUBSTRATE_COLUMNS
+    return meta, {name: np.load(os.path.join(path, name + '.npy'), mmap_mode='r') for name in columns}
+
+
+def save_vnr_batch(path, batch):
+    columns = {name: np.asarray(batch[name], dtype=np.int64) for name in VNR_COLUMNS if name in batch}
+    columns.setdefault('vnr_id', np.arange(len(columns['vm_offsets']) - 1, dtype=np.int64))
+    _write(path, 'vnr', columns, count=len(columns['vnr_id']))
+
+
+def save_vnr_requests(path, vne_requests):
+    # From the list of per-request dicts the generator pickles
+    num_vms, num_links, vm_cpu, links, bandwidth = [], [], [], [], []
+    for vnr in vne_requests:
+        vm_links = vnr['vm_links']
+        if vm_links and isinstance(vm_links[0], int):  # Flat [vm1, vm2, vm1, vm2, ...] lists
+            vm_links = [(vm_links[j], vm_links[j + 1]) for j in range(0, len(vm_links), 2)]
+        num_vms.append(len(vnr['vm_cpu_cores']))
+        num_links.append(len(vm_links))
+        vm_cpu.extend(vnr['vm_cpu_cores'])
+        links.extend(vm_links)
+        bandwidth.extend(vnr['bandwidth_values'])
+    links = np.array(links, dtype=np.int64).reshape(-1, 2)
+    save_vnr_batch(path, {'vm_offsets': np.concatenate(([0], np.cumsum(num_vms))), 'vm_cpu': vm_cpu,
+                          'link_offsets': np.concatenate(([0], np.cumsum(num_links))),
+                          'link_src': links[:, 0], 'link_dst': links[:, 1], 'bandwidth': bandwidth,
+                          'vnr_id': [vnr['vnr_id'] for vnr in vne_requests]})
+
+
+HOST_FIELDS = ('allocated_cores',)
+LINK_FIELDS = ('node1', 'node2', 'assigned_bandwidth')
+
+
+def _substrate_extra(sn_topology):
+    # The entries of the topology dict that have no column
+    hosts = [f'h{i + 1}' for i in range(sn_topology['num_hosts'])]
+    extra = {
+        'entries': {key: value for key, value in sn_topology.items()
+                    if key not in ('num_hosts', 'links_details') and key not in hosts},
+        'hosts': {host: {key: value for key, value in sn_topology[host].items() if key not in HOST_FIELDS}
+                  for host in hosts},
+        'links': {str(i): {key: value for key, value in link.items() if key not in LINK_FIELDS}
+                  for i, link in enumerate(sn_topology['links_details'])},
+    }
+    extra['hosts'] = {host: fields for host, fields in extra['hosts'].items() if fields}
+    extra['links'] = {i: fields for i, fields in extra['links'].items() if fields}
+    try:
+        json.dumps(extra)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Substrate entries without a column must be JSON-serialisable: {e}") from None
+    return extra
+
+
+def save_substrate(path, sn_topology):
+    nodes = {}
+    for link in sn_topology['links_details']:
+        nodes.setdefault(link['node1'], len(nodes))
+        nodes.setdefault(link['node2'], len(nodes))
+    links = sn_topology['links_details']
+    extra = _substrate_extra(sn_topology)
+    _write(path, 'substrate', {
+        'host_cores': np.array([sn_topology[f'h{i + 1}']['allocated_cores'] for i in range(sn_topology['num_hosts'])]),
+        'link_node1': np.array([nodes[link['node1']] for link in links], dtype=np.int32),
+        'link_node2': np.array([nodes[link['node2']] for link in links], dtype=np.int32),
+        'link_bandwidth': np.array([link['assigned_bandwidth'] for link in links]),
+    }, nodes=list(nodes), extra=extra)
+
+
+class VNRSet:
+    # Read-only sequence of VNR dicts backed by a memory-mapped store; usable wherever the list of
+    # dicts from a VNR pickle is
+    def __init__(self, path, meta=None, columns=None):
+        if columns is None:
+            meta, columns = _read(path)
+        self.path = path
+        self.columns = columns
+        self.count = meta['count']
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, p):
+        if isinstance(p, slice):
+            return [self[i] for i in range(*p.indices(self.count))]
+        if p < 0:
+            p += self.count
+        if not 0 <= p < self.count:
+            raise IndexError(p)
+        c = self.columns
+        vm_start, vm_end = int(c['vm_offsets'][p]), int(c['vm_offsets'][p + 1])
+        link_start, link_end = int(c['link_offsets'][p]), int(c['link_offsets'][p + 1])
+        return {
+            'num_vms': vm_end - vm_start,
+            'vm_cpu_cores': c['vm_cpu'][vm_start:vm_end].tolist(),
+            'vm_links': list(zip(c['link_src'][link_start:link_end].tolist(), c['link_dst'][link_start:link_end].tolist())),
+            'bandwidth_values': c['bandwidth'][link_start:link_end].tolist(),
+            'vnr_id': int(c['vnr_id'][p])
+        }
+
+    def __iter__(self):
+        for p in range(self.count):
+            yield self[p]
+
+
+def _substrate(meta, columns):
+    nodes = meta['nodes']
+    sn_topology = {f'h{i + 1}': {'allocated_cores': cores} for i, cores in enumerate(columns['host_cores'].tolist())}
+    sn_topology['num_hosts'] = len(columns['host_cores'])
+    sn_topology['links_details'] = [{'node1': nodes[node1], 'node2': nodes[node2], 'assigned_bandwidth': bw}
+                                    for node1, node2, bw in zip(columns['link_node1'].tolist(),
+                                                                columns['link_node2'].tolist(),
+                                                                columns['link_bandwidth'].tolist())]
+    extra = meta.get('extra', {})
+    for key, value in extra.get('entries', {}).items():
+        sn_topology[key] = value
+    for host, fields in extra.get('hosts', {}).items():
+        sn_topology[host].update(fields)
+    for i, fields in extra.get('links', {}).items():
+        sn_topology['links_details'][int(i)].update(fields)
+    return sn_topology
+
+
+def load(path):
+    # A VNR store loads as a VNRSet, a substrate store as the SN topology dict, anything else is unpickled
+    if is_store(path):
+        meta, columns = _read(path)
+        return VNRSet(path, meta, columns) if meta['kind'] == 'vnr' else _substrate(meta, columns)
+    with open(path, 'rb') as file:
+        return pickle.load(file)
+
+
+def store_path(pickle_path):
+    # VNR/vnr20.0.topo.pickle -> VNR/vnr20.0.topo.cols
+    return os.path.splitext(pickle_path)[0] + SUFFIX
+
+
+def convert(pickle_path, output_path=None):
+    output_path = output_path or store_path(pickle_path)
+    with open(pickle_path, 'rb') as file:
+        data = pickle.load(file)
+    if isinstance(data, dict) and 'links_details' in data:
+        save_substrate(output_path, data)
+    else:
+        save_vnr_requests(output_path, data)
+    return output_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Convert VNR and substrate pickles to the columnar store format')
+    parser.add_argument('pickles', nargs='+', help='e.g. VNR/*.topo.pickle SN/SN.topo.pickle')
+    args = parser.parse_args()
+    for pickle_path in args.pickles:
+        print(f"{pickle_path} -> {convert(pickle_path)}")
+
+
+if __name__ == '__main__':
+    main()